@@ -21,6 +21,9 @@ collect_ignore = [
 if sys.version_info < (3, 6):
     # Python 2 not supported syntax
     collect_ignore.append('test/test_inference/test_mixed.py')
+if sys.version_info < (3, 4):
+    # asyncio
+    collect_ignore.append('test/test_api/test_asynchronous.py')
 
 
 # The following hooks (pytest_configure, pytest_unconfigure) are used
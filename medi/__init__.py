@@ -33,7 +33,9 @@ from medi.api.environment import find_virtualenvs, find_system_environments, \
     get_default_environment, InvalidPythonEnvironment, create_environment, \
     get_system_environment, InterpreterEnvironment
 from medi.api.project import Project, get_default_project
-from medi.api.exceptions import InternalError, RefactoringError
+from medi.api.session import InferenceSession
+from medi.api.asynchronous import AsyncScript, CancellationToken
+from medi.api.exceptions import InternalError, RefactoringError, Cancelled
 
 # Finally load the internal plugins. This is only internal.
 from medi.plugins import registry
@@ -29,10 +29,9 @@ from medi.api.completion import Completion, search_in_module
 from medi.api.keywords import KeywordName
 from medi.api.project import get_default_project, Project
 from medi.api.errors import marso_to_medi_errors
-from medi.api import refactoring
-from medi.api.refactoring.extract import extract_function, extract_variable
 from medi.inference import InferenceState
 from medi.inference import imports
+from medi.inference.grammar_cache import load_grammar
 from medi.inference.references import find_references
 from medi.inference.arguments import try_iter_content
 from medi.inference.helpers import infer_call_of_leaf
@@ -62,6 +61,45 @@ def _no_python2_support(func):
     return wrapper
 
 
+def _call_cancellable(script, func, *args, **kwargs):
+    inference_state = script._inference_state
+    old_token = inference_state.cancellation_token
+    inference_state.cancellation_token = script._cancellation_token
+    try:
+        return func(*args, **kwargs)
+    finally:
+        inference_state.cancellation_token = old_token
+
+
+def _cancellable(func):
+    """
+    Uses the cancellation token of the script while a request is running. The
+    inference state might be shared with other scripts of a session.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        return _call_cancellable(self, func, self, *args, **kwargs)
+    return wrapper
+
+
+def _time_budget(func):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        time_budget = kwargs.pop('time_budget', None)
+        inference_state = self._inference_state
+        if inference_state.deadline is not None:
+            # Called by another request, e.g. complete uses get_signatures.
+            return func(self, *args, **kwargs)
+
+        inference_state.set_time_budget(time_budget)
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self.timed_out = inference_state.timed_out
+            inference_state.set_time_budget(None)
+    return wrapper
+
+
 class Script(object):
     """
     A Script is the base for completions, goto or whatever you want to do with
@@ -119,16 +157,30 @@ class Script(object):
         also ways to modify the sys path and other things.
     :param language: The programming language of source code.
     :type language: str
+    :param InferenceSession session: Share the inference caches with other
+        scripts of the same session. The project and the environment of the
+        session are used, passing a different ``project``, ``environment``
+        or any ``sys_path`` raises a ``ValueError``.
+    :param CancellationToken cancellation_token: Makes it possible to cancel
+        the requests of this script from another thread, see
+        :class:`.AsyncScript`.
+
+    .. attribute:: timed_out
+
+        True if the last call of :meth:`complete`, :meth:`infer` or
+        :meth:`get_signatures` ran out of its ``time_budget``. Its results are
+        probably incomplete.
     """
     def __init__(self, code=None, line=None, column=None, path=None,
                  encoding=None, sys_path=None, environment=None,
-                 project=None, source=None, language="python"):
+                 project=None, source=None, language="python", session=None,
+                 cancellation_token=None):
 
         self._orig_path = path
         # An empty path (also empty string) should always result in no path.
         self.path = os.path.abspath(path) if path else None
         self.language = language
-        self.grammar = marso.load_grammar(language=self.language)
+        self.grammar = load_grammar(language=self.language)
 
         if encoding is None:
             encoding = 'utf-8'
@@ -168,6 +220,20 @@ class Script(object):
         if sys_path is not None and not is_py3:
             sys_path = list(map(force_unicode, sys_path))
 
+        self._session = session
+        if session is not None:
+            if project is not None and project is not session.project:
+                raise ValueError("The project of a session cannot be changed")
+            if environment is not None and environment is not session.environment:
+                raise ValueError("The environment of a session cannot be changed")
+            if sys_path is not None:
+                raise ValueError(
+                    "A session does not accept a sys_path, "
+                    "use InferenceSession(Project(dir, sys_path=sys_path))"
+                )
+            project = session.project
+            environment = session.environment
+
         if project is None:
             # Load the Python grammar of the current interpreter.
             project = get_default_project(
@@ -184,9 +250,13 @@ class Script(object):
                 stacklevel=2
             )
 
-        self._inference_state = InferenceState(
-            project, environment=environment, script_path=self.path
-        )
+        if session is None:
+            self._inference_state = InferenceState(
+                project, environment=environment, script_path=self.path
+            )
+        else:
+            self._inference_state = session.get_inference_state(self.path)
+        self._cancellation_token = cancellation_token
         debug.speed('init')
         self._module_node, code = self._inference_state.parse_and_get_code(
             code=code,
@@ -201,6 +271,7 @@ class Script(object):
         self._code_lines = marso.split_lines(code, keepends=True)
         self._code = code
         self._pos = line, column
+        self.timed_out = False
 
         cache.clear_time_caches()
         debug.reset_time()
@@ -209,6 +280,12 @@ class Script(object):
     # be called multiple times.
     @cache.memoize_method
     def _get_module(self):
+        if self._session is not None:
+            return self._session.get_module(
+                self.path, self._module_node, self._code, self._create_module)
+        return self._create_module()
+
+    def _create_module(self):
         names = None
         is_package = False
         if self.path is not None:
@@ -260,6 +337,8 @@ class Script(object):
             self._inference_state.environment,
         )
 
+    @_cancellable
+    @_time_budget
     @validate_line_column
     def complete(self, line=None, column=None, **kwargs):
         """
@@ -270,18 +349,27 @@ class Script(object):
 
         :param fuzzy: Default False. Will return fuzzy completions, which means
             that e.g. ``ooa`` will match ``foobar``.
+        :param time_budget: The maximum time in milliseconds for inference. If
+            it runs out, the completions found so far are returned and
+            :attr:`timed_out` is set.
+        :param int limit: Default None. Only returns the best ``limit``
+            completions. Completion objects are only created for those, which
+            is a lot faster if many names match (e.g. after ``numpy.``).
         :return: Completion objects, sorted by name. Normal names appear
             before "private" names that start with ``_`` and those appear
             before magic methods and name mangled names that start with ``__``.
+            Fuzzy completions are sorted by how well they match first, e.g.
+            matches at the start of words before scattered characters.
         :rtype: list of :class:`.Completion`
         """
         return self._complete(line, column, **kwargs)
 
-    def _complete(self, line, column, fuzzy=False):  # Python 2...
+    def _complete(self, line, column, fuzzy=False, limit=None):  # Python 2...
         with debug.increase_indent_cm('complete'):
             completion = Completion(
                 self._inference_state, self._get_module_context(), self._code_lines,
-                (line, column), self.get_signatures, fuzzy=fuzzy, grammar=self.grammar
+                (line, column), self.get_signatures, fuzzy=fuzzy, grammar=self.grammar,
+                limit=limit,
             )
             return completion.complete()
 
@@ -293,6 +381,8 @@ class Script(object):
         )
         return self.complete(*self._pos, fuzzy=fuzzy)
 
+    @_cancellable
+    @_time_budget
     @validate_line_column
     def infer(self, line=None, column=None, **kwargs):
         """
@@ -308,11 +398,39 @@ class Script(object):
 
         :param only_stubs: Only return stubs for this method.
         :param prefer_stubs: Prefer stubs to Python objects for this method.
+        :param time_budget: The maximum time in milliseconds for inference, see
+            :meth:`complete`.
         :rtype: list of :class:`.Name`
         """
         with debug.increase_indent_cm('infer'):
             return self._infer(line, column, **kwargs)
 
+    @_cancellable
+    def infer_many(self, positions, **kwargs):
+        """
+        Like :meth:`infer`, but for many positions at once, e.g. to index a
+        file. The positions are inferred in the order of the file, so
+        definitions are usually inferred before the names that use them, which
+        makes most of them cache hits.
+
+        :param positions: An iterable of ``(line, column)`` tuples.
+        :param only_stubs: Only return stubs for this method.
+        :param prefer_stubs: Prefer stubs to Python objects for this method.
+        :return: A list of ``((line, column), definitions)`` tuples, sorted by
+            position. ``definitions`` is the same list that :meth:`infer`
+            would return.
+        """
+        code_lines = self._code_lines
+        positions = sorted(set(
+            helpers.get_line_column(code_lines, line, column)
+            for line, column in positions
+        ))
+        with debug.increase_indent_cm('infer_many'):
+            return [
+                ((line, column), self._infer(line, column, **kwargs))
+                for line, column in positions
+            ]
+
     def goto_definitions(self, **kwargs):
         warnings.warn(
             "Deprecated since version 0.16.0. Use Script(...).infer instead.",
@@ -355,6 +473,7 @@ class Script(object):
                          follow_builtin_imports=follow_builtin_imports,
                          **kwargs)
 
+    @_cancellable
     @validate_line_column
     def goto(self, line=None, column=None, **kwargs):
         """
@@ -381,6 +500,50 @@ class Script(object):
             # executed by `foo()`, if we the cursor is after `)`.
             return self.infer(line, column, only_stubs=only_stubs, prefer_stubs=prefer_stubs)
         name = self._get_module_context().create_name(tree_name)
+        return self._goto_name(
+            name, follow_imports, follow_builtin_imports, only_stubs, prefer_stubs)
+
+    @_cancellable
+    def goto_all_names(self, all_scopes=True, definitions=True, references=True,
+                       **kwargs):
+        """
+        Calls :meth:`goto` for all the names in the current file, e.g. to index
+        a file. This is much faster than calling :meth:`goto` for every
+        position, because the names are not searched again and they are
+        processed in the order of the file, which makes most of them cache
+        hits.
+
+        :param all_scopes: See :meth:`get_names`, the default is True.
+        :param definitions: See :meth:`get_names`.
+        :param references: See :meth:`get_names`, the default is True.
+        :param follow_imports: See :meth:`goto`.
+        :param follow_builtin_imports: See :meth:`goto`.
+        :param only_stubs: See :meth:`goto`.
+        :param prefer_stubs: See :meth:`goto`.
+        :return: A list of ``(name, definitions)`` tuples, sorted by position.
+            ``name`` is a :class:`.Name` in the current file, ``definitions``
+            is what :meth:`goto` would return for it.
+        """
+        tree_names = helpers.get_module_names(
+            self._module_node,
+            all_scopes=all_scopes,
+            definitions=definitions,
+            references=references,
+        )
+        module_context = self._get_module_context()
+        result = []
+        with debug.increase_indent_cm('goto_all_names'):
+            for tree_name in sorted(tree_names, key=lambda n: n.start_pos):
+                name = module_context.create_name(tree_name)
+                result.append((
+                    classes.Name(self._inference_state, name),
+                    self._goto_name(name, **kwargs),
+                ))
+        return result
+
+    def _goto_name(self, name, follow_imports=False, follow_builtin_imports=False,
+                   only_stubs=False, prefer_stubs=False):
+        tree_name = name.tree_name
 
         # Make it possible to goto the super class function/attribute
         # definitions, when they are overwritten.
@@ -410,6 +573,7 @@ class Script(object):
         # Avoid duplicates
         return list(set(helpers.sorted_definitions(defs)))
 
+    @_cancellable
     @_no_python2_support
     def search(self, string, **kwargs):
         """
@@ -441,6 +605,7 @@ class Script(object):
             fuzzy=fuzzy,
         )
 
+    @_cancellable
     def complete_search(self, string, **kwargs):
         """
         Like :meth:`.Script.search`, but completes that string. If you want to
@@ -456,6 +621,7 @@ class Script(object):
         """
         return self._search_func(string, complete=True, **kwargs)
 
+    @_cancellable
     @validate_line_column
     def help(self, line=None, column=None):
         """
@@ -501,6 +667,7 @@ class Script(object):
         )
         return self.get_references(*self._pos, **kwargs)
 
+    @_cancellable
     @validate_line_column
     def get_references(self, line=None, column=None, **kwargs):
         """
@@ -535,6 +702,8 @@ class Script(object):
         )
         return self.get_signatures(*self._pos)
 
+    @_cancellable
+    @_time_budget
     @validate_line_column
     def get_signatures(self, line=None, column=None):
         """
@@ -550,6 +719,8 @@ class Script(object):
 
         This would return an empty list..
 
+        :param time_budget: The maximum time in milliseconds for inference, see
+            :meth:`complete`.
         :rtype: list of :class:`.Signature`
         """
         pos = line, column
@@ -572,6 +743,7 @@ class Script(object):
         return [classes.Signature(self._inference_state, signature, call_details)
                 for signature in definitions.get_signatures()]
 
+    @_cancellable
     @validate_line_column
     def get_context(self, line=None, column=None):
         """
@@ -647,6 +819,7 @@ class Script(object):
         finally:
             self._inference_state.is_analysis = False
 
+    @_cancellable
     def get_names(self, **kwargs):
         """
         Returns names defined in the current file.
@@ -698,6 +871,7 @@ class Script(object):
 
     def _rename(self, line, column, new_name):  # Python 2...
         definitions = self.get_references(line, column, include_builtins=False)
+        from medi.api import refactoring
         return refactoring.rename(self._inference_state, definitions, new_name)
 
     @_no_python2_support
@@ -738,6 +912,7 @@ class Script(object):
             if until_column is None:
                 until_column = len(self._code_lines[until_line - 1])
             until_pos = until_line, until_column
+        from medi.api.refactoring.extract import extract_variable
         return extract_variable(
             self._inference_state, self.path, self._module_node,
             new_name, (line, column), until_pos
@@ -788,6 +963,7 @@ class Script(object):
             if until_column is None:
                 until_column = len(self._code_lines[until_line - 1])
             until_pos = until_line, until_column
+        from medi.api.refactoring.extract import extract_function
         return extract_function(
             self._inference_state, self.path, self._get_module_context(),
             new_name, (line, column), until_pos
@@ -812,6 +988,7 @@ class Script(object):
         :rtype: :class:`.Refactoring`
         """
         names = [d._name for d in self.get_references(line, column, include_builtins=True)]
+        from medi.api import refactoring
         return refactoring.inline(self._inference_state, names)
 
 
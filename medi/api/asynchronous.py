@@ -0,0 +1,157 @@
+"""
+Inference can take a while and a language server usually has to answer other
+messages in the meantime. An :class:`.AsyncScript` runs the requests of a
+:class:`.Script` in a worker thread and returns awaitables::
+
+    script = medi.AsyncScript(code, path=path)
+    completions = await script.complete(line, column)
+
+If the user keeps typing, the result is not needed anymore. Cancel the script
+(or the asyncio task that awaits it) and the request stops at the next
+checkpoint of the inference with :class:`.Cancelled`::
+
+    script.cancel()
+
+Checkpoints are in :func:`.infer_node`, :meth:`.InferenceState.execute` and in
+the loops of the reference search, so cancelled requests stop quickly.
+
+.. note:: Medi is not thread safe. All the requests of all async scripts are
+    therefore running in the same worker thread. The results are normal API
+    objects, accessing some of their attributes (e.g. ``docstring()``) infers
+    again in the calling thread, so don't do that while other requests are
+    running. This is Python 3 only.
+"""
+import functools
+
+from medi.api import Script
+from medi.api.exceptions import Cancelled
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(max_workers=1)
+    return _executor
+
+
+class CancellationToken(object):
+    """
+    Cancels the requests of a :class:`.Script` that was created with it. Can
+    be used from any thread.
+    """
+    def __init__(self):
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def raise_if_cancelled(self):
+        """
+        :raises Cancelled: If :meth:`cancel` has been called.
+        """
+        if self._cancelled:
+            raise Cancelled()
+
+
+class AsyncScript(object):
+    """
+    Takes the same arguments as :class:`.Script`. The script itself is created
+    (and the code parsed) in the worker thread as well. All methods return
+    :class:`asyncio.Future` objects and have to be called while an event loop
+    is running.
+    """
+    def __init__(self, *args, **kwargs):
+        self._cancellation_token = kwargs['cancellation_token'] = CancellationToken()
+        self._script_args = args
+        self._script_kwargs = kwargs
+        self._script = None
+
+    def cancel(self):
+        """
+        Cancels all running and pending requests of this script. Their futures
+        raise :class:`.Cancelled`.
+        """
+        self._cancellation_token.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancellation_token.cancelled
+
+    def _run(self, method_name, args, kwargs):
+        self._cancellation_token.raise_if_cancelled()
+        if self._script is None:
+            self._script = Script(*self._script_args, **self._script_kwargs)
+        return getattr(self._script, method_name)(*args, **kwargs)
+
+    def _submit(self, method_name, *args, **kwargs):
+        import asyncio
+        future = asyncio.get_event_loop().run_in_executor(
+            _get_executor(),
+            functools.partial(self._run, method_name, args, kwargs)
+        )
+        future.add_done_callback(self._cancel_if_future_cancelled)
+        return future
+
+    def _cancel_if_future_cancelled(self, future):
+        # The worker thread cannot be interrupted, the request has to stop at
+        # its next checkpoint.
+        if future.cancelled():
+            self.cancel()
+
+    def complete(self, line=None, column=None, **kwargs):
+        """
+        See :meth:`.Script.complete`.
+        """
+        return self._submit('complete', line, column, **kwargs)
+
+    def infer(self, line=None, column=None, **kwargs):
+        """
+        See :meth:`.Script.infer`.
+        """
+        return self._submit('infer', line, column, **kwargs)
+
+    def goto(self, line=None, column=None, **kwargs):
+        """
+        See :meth:`.Script.goto`.
+        """
+        return self._submit('goto', line, column, **kwargs)
+
+    def help(self, line=None, column=None):
+        """
+        See :meth:`.Script.help`.
+        """
+        return self._submit('help', line, column)
+
+    def get_signatures(self, line=None, column=None):
+        """
+        See :meth:`.Script.get_signatures`.
+        """
+        return self._submit('get_signatures', line, column)
+
+    def get_references(self, line=None, column=None, **kwargs):
+        """
+        See :meth:`.Script.get_references`.
+        """
+        return self._submit('get_references', line, column, **kwargs)
+
+    def search(self, string, **kwargs):
+        """
+        See :meth:`.Script.search`.
+        """
+        return self._submit('search', string, **kwargs)
+
+    def complete_search(self, string, **kwargs):
+        """
+        See :meth:`.Script.complete_search`.
+        """
+        return self._submit('complete_search', string, **kwargs)
+
+    def __repr__(self):
+        return '<%s: %r>' % (self.__class__.__name__, self._script_kwargs.get('path'))
@@ -1,4 +1,5 @@
 import re
+import heapq
 from textwrap import dedent
 
 from marso.python.token import PythonTokenTypes
@@ -66,7 +67,26 @@ def _must_be_kwarg(signatures, positional_count, used_kwargs):
 
 
 def filter_names(inference_state, completion_names, stack, like_name, fuzzy, cached_name):
-    comp_dct = set()
+    for name, new in _filter_names(inference_state, completion_names, stack,
+                                   like_name, fuzzy, cached_name):
+        yield new if new is not None else classes.Completion(
+            inference_state,
+            name,
+            stack,
+            len(like_name),
+            is_fuzzy=fuzzy,
+            cached_name=cached_name,
+        )
+
+
+def _filter_names(inference_state, completion_names, stack, like_name, fuzzy, cached_name):
+    """
+    Yields ``(name, completion)`` tuples of the names that match ``like_name``
+    without duplicates. The :class:`.classes.Completion` is only created if it
+    is needed to find duplicates, otherwise it's None.
+    """
+    seen = set()
+    like_name_length = len(like_name)
     if settings.case_insensitive_completion:
         like_name = like_name.lower()
     for name in completion_names:
@@ -74,23 +94,28 @@ def filter_names(inference_state, completion_names, stack, like_name, fuzzy, cac
         if settings.case_insensitive_completion:
             string = string.lower()
         if helpers.match(string, like_name, fuzzy=fuzzy):
-            new = classes.Completion(
-                inference_state,
-                name,
-                stack,
-                len(like_name),
-                is_fuzzy=fuzzy,
-                cached_name=cached_name,
-            )
-            k = (new.name, new.complete)  # key
-            if k not in comp_dct:
-                comp_dct.add(k)
+            if settings.add_bracket_after_function:
+                # The completed string depends on the type of the name.
+                new = classes.Completion(
+                    inference_state,
+                    name,
+                    stack,
+                    like_name_length,
+                    is_fuzzy=fuzzy,
+                    cached_name=cached_name,
+                )
+                k = (new.name, new.complete)  # key
+            else:
+                new = None
+                k = name.get_public_name()
+            if k not in seen:
+                seen.add(k)
                 tree_name = name.tree_name
                 if tree_name is not None:
                     definition = tree_name.get_definition()
                     if definition is not None and definition.type == 'del_stmt':
                         continue
-                yield new
+                yield name, new
 
 
 def get_user_context(module_context, position):
@@ -118,7 +143,7 @@ def complete_param_names(context, function_name, decorator_nodes):
 
 class Completion:
     def __init__(self, inference_state, module_context, code_lines, position,
-                 signatures_callback, fuzzy=False, grammar=None):
+                 signatures_callback, fuzzy=False, grammar=None, limit=None):
         self._inference_state = inference_state
         self._module_context = module_context
         self._module_node = module_context.tree_node
@@ -132,6 +157,7 @@ class Completion:
         self._signatures_callback = signatures_callback
 
         self._fuzzy = fuzzy
+        self._limit = limit
         self.grammar = grammar
 
     def complete(self):
@@ -146,13 +172,41 @@ class Completion:
             cached_name, completion_names = self._complete_python(leaf)
 
 
-        completions = list(filter_names(self._inference_state, completion_names,
-                                        self.stack, self._like_name,
-                                        self._fuzzy, cached_name=cached_name))
+        filtered = _filter_names(self._inference_state, completion_names,
+                                 self.stack, self._like_name,
+                                 self._fuzzy, cached_name=cached_name)
+        if self._limit is None:
+            filtered = sorted(filtered, key=self._get_sort_key)
+        else:
+            # Only the best names are wrapped in Completion objects.
+            filtered = heapq.nsmallest(self._limit, filtered, key=self._get_sort_key)
 
-        return sorted(completions, key=lambda x: (x.name.startswith('__'),
-                                                 x.name.startswith('_'),
-                                                 x.name.lower()))
+        return [
+            new if new is not None else classes.Completion(
+                self._inference_state,
+                name,
+                self.stack,
+                len(self._like_name),
+                is_fuzzy=self._fuzzy,
+                cached_name=cached_name,
+            )
+            for name, new in filtered
+        ]
+
+    def _get_sort_key(self, name_and_completion):
+        name = name_and_completion[0].get_public_name()
+        key = (name.startswith('__'), name.startswith('_'), name.lower())
+        if self._fuzzy and self._like_name:
+            # Better matches first, even before the private names.
+            ignore_case = settings.case_insensitive_completion
+            like_name = self._like_name.lower() if ignore_case else self._like_name
+            score = helpers.fuzzy_score(name, like_name, ignore_case=ignore_case)
+            if score is None:
+                # Names are filtered differently, e.g. with unicode that
+                # changes its length when lowered. Just put them last.
+                score = float('-inf')
+            return (-score,) + key
+        return key
 
     def _complete_demo(self, leaf):
         self.stack = stack = None
@@ -1,19 +1,28 @@
 """
 Environments are a way to activate different Python versions or Virtualenvs for
 static analysis. The Python binary in that environment is going to be executed.
+
+Running a Python binary to find out its version takes a while. Therefore the
+results of these probes (and the hashes of the binaries, which are used to
+check if they are safe) are stored in :attr:`medi.settings.cache_directory`,
+keyed by the path, modification time and size of the binary. Candidates of
+:func:`find_virtualenvs` and :func:`find_system_environments` are probed in
+parallel.
 """
 import os
 import sys
 import hashlib
 import filecmp
+import threading
 from collections import namedtuple
 
-from medi._compatibility import highest_pickle_protocol, which
-from medi.cache import memoize_method, time_cache
+from medi import settings
+from medi._compatibility import highest_pickle_protocol, which, pickle, \
+    pickle_load
+from medi.cache import memoize_method, time_cache, dump_atomically
 from medi.inference.compiled.subprocess import CompiledSubprocess, \
-    InferenceStateSameProcess, InferenceStateSubprocess
-
-import marso
+    CompiledSubprocessPool, InferenceStateSameProcess, InferenceStateSubprocess
+from medi.inference.grammar_cache import load_grammar
 
 _VersionInfo = namedtuple('VersionInfo', 'major minor micro')
 
@@ -21,6 +30,11 @@ _SUPPORTED_PYTHONS = ['3.8', '3.7', '3.6', '3.5', '2.7']
 _SAFE_PATHS = ['/usr/bin', '/usr/local/bin']
 _CONDA_VAR = 'CONDA_PREFIX'
 _CURRENT_VERSION = '%s.%s' % (sys.version_info.major, sys.version_info.minor)
+_MAX_PROBE_THREADS = 8
+_PROBE_CACHE_VERSION = 2
+
+_probe_caches = {}
+_probe_cache_lock = threading.Lock()
 
 
 class InvalidPythonEnvironment(Exception):
@@ -34,14 +48,14 @@ class _BaseEnvironment(object):
     @memoize_method
     def get_grammar(self):
         version_string = '%s.%s' % (self.version_info.major, self.version_info.minor)
-        return marso.load_grammar(version=version_string)
+        return load_grammar(version=version_string)
 
     @property
     def _sha256(self):
         try:
             return self._hash
         except AttributeError:
-            self._hash = _calculate_sha256_for_file(self.executable)
+            self._hash = _get_sha256(self.executable)
             return self._hash
 
 
@@ -64,21 +78,23 @@ class Environment(_BaseEnvironment):
     def __init__(self, executable):
         self._start_executable = executable
         # Initialize the environment
-        self._get_subprocess()
-
-    def _get_subprocess(self):
-        if self._subprocess is not None and not self._subprocess.is_crashed:
-            return self._subprocess
-
         try:
-            self._subprocess = CompiledSubprocess(self._start_executable)
-            info = self._subprocess._send(None, _get_info)
+            info = _get_probe_result(u'info', executable, self._probe)
         except Exception as exc:
             raise InvalidPythonEnvironment(
                 "Could not get version information for %r: %r" % (
                     self._start_executable,
                     exc))
+        self._set_info(info)
+
+    def _probe(self, executable):
+        # Failures raise and are therefore not cached. A broken executable
+        # might just be in the middle of being installed.
+        # The subprocess is kept, it's probably going to be used anyway.
+        self._subprocess = CompiledSubprocess(executable)
+        return self._subprocess._send(None, _get_info)
 
+    def _set_info(self, info):
         # Since it could change and might not be the same(?) as the one given,
         # set it here.
         self.executable = info[0]
@@ -100,18 +116,48 @@ class Environment(_BaseEnvironment):
             self.executable = self.executable.decode()
             self.path = self.path.decode()
 
+        if self._subprocess is not None:
+            self._subprocess._pickle_protocol = self._get_pickle_protocol()
+
+    def _get_pickle_protocol(self):
         # Adjust pickle protocol according to host and client version.
-        self._subprocess._pickle_protocol = highest_pickle_protocol([
-            sys.version_info, self.version_info])
+        return highest_pickle_protocol([sys.version_info, self.version_info])
 
+    def _get_subprocess(self):
+        if self._subprocess is None or self._subprocess.is_crashed:
+            self._subprocess = self._create_subprocess()
         return self._subprocess
 
     def __repr__(self):
         version = '.'.join(str(i) for i in self.version_info)
         return '<%s: %s in %s>' % (self.__class__.__name__, version, self.path)
 
+    def _create_subprocess(self):
+        subprocess = CompiledSubprocess(self._start_executable)
+        subprocess._pickle_protocol = self._get_pickle_protocol()
+        return subprocess
+
+    @memoize_method
+    def _get_subprocess_pool(self):
+        return CompiledSubprocessPool(
+            self._get_subprocess(),
+            self._create_subprocess,
+            settings.environment_subprocesses,
+        )
+
+    def get_subprocess_stats(self):
+        """
+        Returns a list with a dict for each subprocess of this environment,
+        see :attr:`medi.settings.environment_subprocesses`. The dicts contain
+        the number of ``inference_states`` and ``access_handles`` that are
+        alive in the subprocess and its resident memory (``rss``) in bytes,
+        which is None if it's not available on this platform.
+        """
+        return self._get_subprocess_pool().get_stats()
+
     def get_inference_state_subprocess(self, inference_state):
-        return InferenceStateSubprocess(inference_state, self._get_subprocess())
+        compiled_subprocess = self._get_subprocess_pool().get_subprocess(id(inference_state))
+        return InferenceStateSubprocess(inference_state, compiled_subprocess)
 
     @memoize_method
     def get_sys_path(self):
@@ -177,6 +223,85 @@ def _calculate_sha256_for_file(path):
     return sha256.hexdigest()
 
 
+def _get_sha256(path):
+    return _get_probe_result(u'sha256', path, _calculate_sha256_for_file)
+
+
+def _get_probe_cache_path():
+    return os.path.join(
+        settings.cache_directory,
+        'environments',
+        'probes-py%s-%s.pkl' % (sys.version_info[0], _PROBE_CACHE_VERSION)
+    )
+
+
+def _load_probe_cache(path):
+    try:
+        return _probe_caches[path]
+    except KeyError:
+        pass
+
+    try:
+        with open(path, 'rb') as f:
+            cache = pickle_load(f)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        cache = {}
+    _probe_caches[path] = cache
+    return cache
+
+
+def _get_probe_result(kind, executable, probe):
+    """
+    Returns ``probe(executable)``, which is cached as long as the executable
+    does not change. Exceptions are not cached.
+    """
+    try:
+        stat = os.stat(executable)
+    except OSError:
+        # Let the probe raise a proper exception.
+        return probe(executable)
+    key = stat.st_mtime, stat.st_size
+
+    path = _get_probe_cache_path()
+    with _probe_cache_lock:
+        entry = _load_probe_cache(path).get((kind, executable))
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    result = probe(executable)
+    with _probe_cache_lock:
+        cache = _load_probe_cache(path)
+        cache[kind, executable] = key, result
+        dump_atomically(path, cache)
+    return result
+
+
+def _probe_in_parallel(function, arguments):
+    """
+    Calls ``function`` for all ``arguments`` in threads, because most of the
+    time is spent waiting for Python subprocesses to start. Returns the
+    results in the order of ``arguments``, except for the ones that raised
+    :exc:`InvalidPythonEnvironment`.
+    """
+    def probe(argument):
+        try:
+            return function(argument)
+        except InvalidPythonEnvironment:
+            return None
+
+    if len(arguments) <= 1:
+        results = [probe(a) for a in arguments]
+    else:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(len(arguments), _MAX_PROBE_THREADS))
+        try:
+            results = pool.map(probe, arguments)
+        finally:
+            pool.close()
+            pool.join()
+    return [r for r in results if r is not None]
+
+
 def get_default_environment():
     """
     Tries to return an active Virtualenv or conda environment.
@@ -300,6 +425,7 @@ def find_virtualenvs(paths=None, **kwargs):
                 yield conda_env
                 _used_paths.add(conda_env.path)
 
+        candidates = []
         for directory in paths:
             if not os.path.isdir(directory):
                 continue
@@ -311,12 +437,13 @@ def find_virtualenvs(paths=None, **kwargs):
                     # A path shouldn't be inferred twice.
                     continue
                 _used_paths.add(path)
+                candidates.append(path)
+
+        def create(path):
+            return Environment(_get_executable_path(path, safe=safe))
 
-                try:
-                    executable = _get_executable_path(path, safe=safe)
-                    yield Environment(executable)
-                except InvalidPythonEnvironment:
-                    pass
+        for environment in _probe_in_parallel(create, candidates):
+            yield environment
 
     return py27_comp(paths, **kwargs)
 
@@ -331,11 +458,8 @@ def find_system_environments():
 
     :yields: :class:`.Environment`
     """
-    for version_string in _SUPPORTED_PYTHONS:
-        try:
-            yield get_system_environment(version_string)
-        except InvalidPythonEnvironment:
-            pass
+    for environment in _probe_in_parallel(get_system_environment, _SUPPORTED_PYTHONS):
+        yield environment
 
 
 # TODO: this function should probably return a list of environments since
@@ -437,6 +561,7 @@ def _is_safe(executable_path):
     # Just check the list of known Python versions. If it's not in there,
     # it's likely an attacker or some Python that was not properly
     # installed in the system.
+    sha256 = None
     for environment in find_system_environments():
         if environment.executable == real_path:
             return True
@@ -449,7 +574,13 @@ def _is_safe(executable_path):
         # virtualenv's Python is not (which is probably never going to get
         # upgraded), it will not work with Medi. IMO that's fine, because
         # people should just be using venv. ~ dave
-        if environment._sha256 == _calculate_sha256_for_file(real_path):
+        # The hash of the checked binary is always recomputed, because its
+        # mtime and size (the key of the probe cache) are easy to forge for
+        # whoever is able to write it. The hashes of the system binaries are
+        # cached, they are found in known locations.
+        if sha256 is None:
+            sha256 = _calculate_sha256_for_file(real_path)
+        if environment._sha256 == sha256:
             return True
     return False
 
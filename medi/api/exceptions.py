@@ -18,6 +18,15 @@ class WrongVersion(_MediError):
     """
 
 
+class Cancelled(_MediError):
+    """
+    Raised by a request that has been cancelled with
+    :meth:`.CancellationToken.cancel` (see :class:`.AsyncScript`). Caches are
+    left in a consistent state, so the same :class:`.InferenceSession` can be
+    used for the next request.
+    """
+
+
 class RefactoringError(_MediError):
     """
     Refactorings can fail for various reasons. So if you work with refactorings
@@ -27,12 +27,55 @@ def _start_match(string, like_name):
 
 
 def _fuzzy_match(string, like_name):
-    if len(like_name) <= 1:
-        return like_name in string
-    pos = string.find(like_name[0])
-    if pos >= 0:
-        return _fuzzy_match(string[pos + 1:], like_name[1:])
-    return False
+    pos = 0
+    for char in like_name:
+        pos = string.find(char, pos) + 1
+        if not pos:
+            return False
+    return True
+
+
+def fuzzy_score(string, like_name, ignore_case=False):
+    """
+    Scores how well ``like_name`` matches ``string`` as a fuzzy completion,
+    higher is better. Characters at the start of words (after an underscore or
+    at a camelCase hump) and consecutive characters score more, skipped
+    characters less. The characters are matched greedily in one pass.
+
+    :param ignore_case: If True, ``like_name`` is expected to be lower case.
+    :returns: The score or None if ``like_name`` is not a subsequence of
+        ``string``.
+    """
+    score = 0
+    previous = -1
+    for char in like_name:
+        if ignore_case:
+            # The case is compared per character, because lowering the whole
+            # string can change its length (e.g. for u'\u0130'), which would
+            # make the indexes invalid for ``string``.
+            for index in range(previous + 1, len(string)):
+                if char in string[index].lower():
+                    break
+            else:
+                return None
+        else:
+            index = string.find(char, previous + 1)
+            if index < 0:
+                return None
+        if index == 0:
+            score += 10
+        elif index == previous + 1:
+            score += 8
+        else:
+            before = string[index - 1]
+            if before == '_' or before.islower() and string[index].isupper():
+                score += 6
+            else:
+                score += 1
+            score -= min(index - previous - 1, 3)
+        previous = index
+    # Prefer shorter names if the characters match equally well.
+    return score - (len(string) - previous - 1) * 0.01
 
 
 def match(string, like_name, fuzzy=False):
@@ -458,27 +501,40 @@ def cache_signatures(inference_state, context, bracket_leaf, code_lines, user_po
         context,
         bracket_leaf.get_previous_leaf(),
     )
+    # Incomplete results are not cached.
+    yield not inference_state.timed_out
+
+
+def get_line_column(code_lines, line=None, column=None):
+    """
+    Checks a position and fills in the defaults (the end of the code or of
+    the line).
+
+    :raises ValueError: If the position is not in the code.
+    """
+    line = max(len(code_lines), 1) if line is None else line
+    if not (0 < line <= len(code_lines)):
+        raise ValueError('`line` parameter is not in a valid range.')
+
+    line_string = code_lines[line - 1]
+    line_len = len(line_string)
+    if line_string.endswith('\r\n'):
+        line_len -= 2
+    if line_string.endswith('\n'):
+        line_len -= 1
+
+    column = line_len if column is None else column
+    if not (0 <= column <= line_len):
+        raise ValueError('`column` parameter (%d) is not in a valid range '
+                         '(0-%d) for line %d (%r).' % (
+                             column, line_len, line, line_string))
+    return line, column
 
 
 def validate_line_column(func):
     @wraps(func)
     def wrapper(self, line=None, column=None, *args, **kwargs):
-        line = max(len(self._code_lines), 1) if line is None else line
-        if not (0 < line <= len(self._code_lines)):
-            raise ValueError('`line` parameter is not in a valid range.')
-
-        line_string = self._code_lines[line - 1]
-        line_len = len(line_string)
-        if line_string.endswith('\r\n'):
-            line_len -= 2
-        if line_string.endswith('\n'):
-            line_len -= 1
-
-        column = line_len if column is None else column
-        if not (0 <= column <= line_len):
-            raise ValueError('`column` parameter (%d) is not in a valid range '
-                             '(0-%d) for line %d (%r).' % (
-                                 column, line_len, line, line_string))
+        line, column = get_line_column(self._code_lines, line, column)
         return func(self, line, column, *args, **kwargs)
     return wrapper
 
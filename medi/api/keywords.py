@@ -1,18 +1,21 @@
-import pydoc
-
 from medi.inference.utils import ignored
 from medi.inference.names import AbstractArbitraryName
 
-try:
-    from pydoc_data import topics as pydoc_topics
-except ImportError:
-    # Python 2
+
+def _get_pydoc_topics():
+    # pydoc and its topics are big, so they are only imported if a keyword
+    # docstring is actually needed.
     try:
-        import pydoc_topics
+        from pydoc_data import topics as pydoc_topics
     except ImportError:
-        # This is for Python 3 embeddable version, which dont have
-        # pydoc_data module in its file python3x.zip.
-        pydoc_topics = None
+        # Python 2
+        try:
+            import pydoc_topics
+        except ImportError:
+            # This is for Python 3 embeddable version, which dont have
+            # pydoc_data module in its file python3x.zip.
+            pydoc_topics = None
+    return pydoc_topics
 
 
 class KeywordName(AbstractArbitraryName):
@@ -27,11 +30,13 @@ def imitate_pydoc(string):
     It's not possible to get the pydoc's without starting the annoying pager
     stuff.
     """
+    pydoc_topics = _get_pydoc_topics()
     if pydoc_topics is None:
         return ''
 
     # str needed because of possible unicode stuff in py2k (pydoc doesn't work
     # with unicode strings)
+    import pydoc
     string = str(string)
     h = pydoc.help
     with ignored(KeyError):
@@ -52,6 +57,6 @@ def imitate_pydoc(string):
         return ''
 
     try:
-        return pydoc_topics.topics[label].strip() if pydoc_topics else ''
+        return pydoc_topics.topics[label].strip()
     except KeyError:
         return ''
@@ -24,8 +24,10 @@ from medi.inference.imports import load_module_from_path, \
     load_namespace_from_path, iter_module_names
 from medi.inference.sys_path import discover_buildout_paths
 from medi.inference.cache import inference_state_as_method_param_cache
-from medi.inference.references import recurse_find_python_folders_and_files, search_in_file_ios
-from medi.file_io import FolderIO
+from medi.inference.references import recurse_find_python_folders_and_files
+from medi.inference.symbol_index import get_project_index
+from medi.inference.gradual.typeshed import find_stub_modules
+from medi.file_io import FolderIO, FileIO
 from medi.common import traverse_parents
 
 _CONFIG_FOLDER = '.medi'
@@ -208,10 +210,11 @@ class Project(object):
 
     def search(self, string, **kwargs):
         """
-        Searches a name in the whole project. If the project is very big,
-        at some point Medi will stop searching. However it's also very much
-        recommended to not exhaust the generator. Just display the first ten
-        results to the user.
+        Searches a name in the whole project. The definitions of the project
+        are kept in a symbol index in :attr:`medi.settings.cache_directory`,
+        which is updated for files that changed since the last search. It's
+        still very much recommended to not exhaust the generator. Just display
+        the first ten results to the user.
 
         There are currently three different search patterns:
 
@@ -301,8 +304,56 @@ class Project(object):
             ):
                 yield x  # Python 2...
 
-        # 2. Search for identifiers in the project.
-        for module_context in search_in_file_ios(inference_state, file_ios, name):
+        # 2. Search for identifiers in the project. The symbol index knows
+        #    which files define the name, so only those have to be parsed.
+        index = get_project_index(self._path)
+        index.update(inference_state, file_ios)
+        paths = index.find_paths(
+            name,
+            # Only the last part of a dotted name is completed.
+            complete=complete and len(wanted_names) == 1,
+            all_scopes=all_scopes,
+        )
+        for path in paths:
+            try:
+                m = load_module_from_path(inference_state, FileIO(path))
+            except FileNotFoundError:
+                continue
+            if m.is_compiled():
+                continue
+            module_context = m.as_context()
+            names = get_module_names(module_context.tree_node, all_scopes=all_scopes)
+            names = [module_context.create_name(n) for n in names]
+            names = _remove_imports(names)
+            for x in search_in_module(
+                inference_state,
+                module_context,
+                names=names,
+                wanted_type=wanted_type,
+                wanted_names=wanted_names,
+                complete=complete,
+                ignore_imports=True,
+            ):
+                yield x  # Python 2...
+
+        # 3. Search for identifiers in typeshed. Its index contains the names
+        #    of the stubs that were searched before, so only the stubs that
+        #    define the name are loaded.
+        stub_modules = find_stub_modules(
+            inference_state.grammar.version_info,
+            name,
+            complete=complete and len(wanted_names) == 1,
+        )
+        for module_name, path in stub_modules:
+            try:
+                m = load_module_from_path(
+                    inference_state, FileIO(path),
+                    import_names=tuple(module_name.split('.')),
+                    is_package=path.endswith('__init__.pyi'),
+                )
+            except FileNotFoundError:
+                continue
+            module_context = m.as_context()
             names = get_module_names(module_context.tree_node, all_scopes=all_scopes)
             names = [module_context.create_name(n) for n in names]
             names = _remove_imports(names)
@@ -317,7 +368,7 @@ class Project(object):
             ):
                 yield x  # Python 2...
 
-        # 3. Search for modules on sys.path
+        # 4. Search for modules on sys.path
         sys_path = [
             p for p in self._get_sys_path(inference_state)
             # Exclude folders that are handled by recursing of the Python
@@ -0,0 +1,208 @@
+"""
+By default every :class:`.Script` creates its own inference state, which means
+that ``builtins``, ``typing`` and all imported modules are inferred again for
+every request. An :class:`.InferenceSession` keeps an inference state alive, so
+that multiple :class:`.Script` instances for the same project and environment
+can share the caches::
+
+    session = medi.InferenceSession(project=project)
+    medi.Script(code, path=path, session=session).complete()
+    medi.Script(changed_code, path=path, session=session).complete()
+
+When the code of a module changes, only that module is parsed and loaded
+again and only the inferred results that depend on it are discarded. With
+:attr:`medi.settings.fast_parser`, the diff parser keeps the syntax trees of
+the functions and classes that did not change. If only the bodies of functions
+and classes changed, the module is kept and only the results that depend on
+the changed definitions are discarded. Typing in one function of a big module
+therefore doesn't infer all the other functions again.
+"""
+import os
+
+from marso import split_lines
+from marso.python.token import PythonTokenTypes
+from marso.python.tokenizer import tokenize
+
+from medi.api.project import get_default_project
+from medi.file_io import KnownContentFileIO
+from medi.inference import InferenceState
+
+
+def _get_definition_name(node):
+    if node.type == 'decorated':
+        node = node.children[-1]
+    if node.type in ('async_funcdef', 'async_stmt'):
+        node = node.children[-1]
+    if node.type in ('funcdef', 'classdef'):
+        return node.name.value
+    return None
+
+
+def _get_top_level_parts(module_node, code_lines):
+    """
+    Returns a list of ``(node, lines, last leaf)`` tuples for the children of
+    the module node.
+    """
+    parts = []
+    for node in module_node.children:
+        line, column = node.end_pos
+        if column == 0:
+            line -= 1
+        lines = code_lines[node.start_pos[0] - 1:line]
+        parts.append((node, lines, node.get_last_leaf()))
+    return parts
+
+
+def _is_sys_path(node):
+    first, trailer = node.children[:2]
+    return first.type == 'name' and first.value == 'sys' \
+        and trailer.type == 'trailer' and trailer.children[0] == '.' \
+        and trailer.children[1].value == 'path'
+
+
+def _affects_module(node):
+    """
+    Returns True if a node contains global or nonlocal statements, which
+    define names outside of their scope, or uses ``sys.path``, because its
+    modifications are used for all the imports of a module.
+    """
+    try:
+        children = node.children
+    except AttributeError:
+        return False
+    if node.type in ('global_stmt', 'nonlocal_stmt'):
+        return True
+    if node.type in ('power', 'atom_expr') and _is_sys_path(node):
+        return True
+    return any(_affects_module(child) for child in children)
+
+
+def _lines_affect_module(lines, version_info):
+    """
+    Like :func:`_affects_module`, but for the code of a node that might not be
+    available as a tree anymore: The diff parser moves the nodes of the old
+    tree into the new one, so the old children of the module might already
+    contain the new code.
+    """
+    before_previous = previous = None
+    for token in tokenize(''.join(lines), version_info):
+        string = token.string
+        if token.type == PythonTokenTypes.NAME:
+            if string in ('global', 'nonlocal'):
+                return True
+            if string == 'path' and before_previous == 'sys' and previous == '.':
+                return True
+        before_previous, previous = previous, string
+    return False
+
+
+def _get_changed_nodes(old_parts, new_parts, version_info):
+    """
+    Returns the old children of the module node that changed or None if the
+    module changed in a way that can influence all of it, e.g. if module level
+    statements or the names of functions and classes changed.
+    """
+    if len(old_parts) != len(new_parts):
+        return None
+
+    changed_nodes = []
+    for (old_node, old_lines, old_leaf), (node, lines, leaf) in zip(old_parts, new_parts):
+        # The diff parser copies nodes that didn't change, but it might also
+        # reuse a function whose body changed.
+        if node is old_node and leaf is old_leaf and lines == old_lines:
+            continue
+        if node.type == old_node.type == 'endmarker':
+            continue
+        name = _get_definition_name(node)
+        if name is None or name != _get_definition_name(old_node):
+            return None
+        if _affects_module(node) or _lines_affect_module(old_lines, version_info):
+            return None
+        changed_nodes.append(old_node)
+    return changed_nodes
+
+
+class InferenceSession(object):
+    """
+    Shares inference caches between :class:`.Script` instances.
+
+    A session uses one inference state for all scripts in the same directory,
+    because the ``sys.path`` depends on the directory of a script. Switching to
+    a script in another directory starts with empty caches.
+
+    .. warning:: A session is not thread safe. Don't share it between threads
+        and don't use scripts of the same session in different threads at the
+        same time (:class:`.AsyncScript` runs all requests in one thread).
+
+    :param Project project: The project of all the scripts in this session.
+    :param Environment environment: The environment of all the scripts in this
+        session.
+    """
+    def __init__(self, project=None, environment=None):
+        if project is None:
+            project = get_default_project('python')
+        self.project = project
+        self.environment = environment
+        self._inference_state = None
+        self._directory = None
+        self._modules = {}
+
+    def get_inference_state(self, script_path):
+        directory = None if script_path is None else os.path.dirname(script_path)
+        inference_state = self._inference_state
+        if inference_state is None or directory != self._directory:
+            inference_state = self._inference_state = InferenceState(
+                self.project, environment=self.environment, script_path=script_path
+            )
+            inference_state.track_dependencies = True
+            inference_state.module_cache.track_modifications = True
+            self._directory = directory
+            self._modules = {}
+        else:
+            inference_state.script_path = script_path
+            inference_state.reset_request_state()
+            self._invalidate_changed_files()
+        return inference_state
+
+    def _invalidate_changed_files(self):
+        script_modules = set(module for code, module, parts in self._modules.values())
+        module_cache = self._inference_state.module_cache
+        for module in module_cache.iterate_changed_modules():
+            if module not in script_modules:
+                self._inference_state.invalidate_module(module)
+
+    def get_module(self, path, module_node, code, create_module):
+        """
+        Returns the module of a script. The module is reused if the code did
+        not change since the last script with the same path or if the diff
+        parser kept the module and only the bodies of functions and classes
+        changed. Otherwise the old module is invalidated.
+        """
+        try:
+            old_code, module, old_parts = self._modules[path]
+        except KeyError:
+            module = None
+        if module is not None and module.tree_node is module_node and old_code == code:
+            return module
+
+        code_lines = split_lines(code, keepends=True)
+        if module is not None:
+            if module.tree_node is module_node:
+                parts = _get_top_level_parts(module_node, code_lines)
+                changed_nodes = _get_changed_nodes(
+                    old_parts, parts, self._inference_state.grammar.version_info)
+                if changed_nodes is not None and not module.is_stub():
+                    self._inference_state.invalidate_module(module, changed_nodes)
+                    module.code_lines = code_lines
+                    if module.file_io is not None:
+                        module.file_io = KnownContentFileIO(module.file_io.path, code)
+                    self._modules[path] = code, module, parts
+                    return module
+            self._inference_state.invalidate_module(module)
+
+        module = create_module()
+        self._modules[path] = code, module, _get_top_level_parts(module_node, code_lines)
+        return module
+
+    def __repr__(self):
+        return '<%s: %s>' % (self.__class__.__name__, self.project)
@@ -7,14 +7,24 @@ available:
   which can be useful if there's user interaction and the user cannot react
   faster than a certain time.
 
+It also contains the helpers that are shared by the caches that are pickled to
+:attr:`medi.settings.cache_directory`.
+
 This module is one of the reasons why |medi| is not thread-safe. As you can see
 there are global variables, which are holding the cache information. Some of
 these variables are being cleaned after every API usage.
 """
+import os
+import sys
 import time
+import errno
+import platform
+import tempfile
 from functools import wraps
 
+from medi import debug
 from medi import settings
+from medi._compatibility import pickle, pickle_dump
 from marso.cache import parser_cache
 
 _time_caches = {}
@@ -50,7 +60,8 @@ def signature_time_cache(time_add_setting):
     But: This function is only called if the key is not available. After a
     certain amount of time (`time_add_setting`) the cache is invalid.
 
-    If the given key is None, the function will not be cached.
+    If the given key is None or if the key function yields False after the
+    value, the function will not be cached.
     """
     def _temp(key_func):
         dct = {}
@@ -68,7 +79,7 @@ def signature_time_cache(time_add_setting):
 
             value = next(generator)
             time_add = getattr(settings, time_add_setting)
-            if key is not None:
+            if key is not None and next(generator, True):
                 dct[key] = time.time() + time_add, value
             return value
         return wrapper
@@ -112,3 +123,61 @@ def memoize_method(method):
             dct[key] = result
             return result
     return wrapper
+
+
+def get_version_tag(*parts):
+    """
+    Returns a name for the directory of a pickled cache. Pickles are not
+    compatible between Python implementations and versions, so these are
+    always part of it. ``parts`` should contain a format version, which is
+    incremented whenever the structure of the pickled data changes.
+    """
+    return '-'.join((
+        platform.python_implementation(),
+        '%s%s' % sys.version_info[:2],
+    ) + tuple(str(p) for p in parts))
+
+
+def dump_atomically(path, data, dump=None):
+    """
+    Pickles ``data`` to ``path``. It's written to a temporary file first, so
+    processes sharing the cache directory never read a partially written
+    file. The directory is created if necessary.
+
+    Cache files are optional, so errors are only logged.
+
+    :param dump: Called like ``dump(data, file)`` instead of
+        :func:`pickle_dump` if given.
+    :returns: True if the file was written.
+    """
+    directory = os.path.dirname(path)
+    try:
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    except OSError:
+        debug.warning('Cannot write to the cache directory %s', directory)
+        return False
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if dump is None:
+                pickle_dump(data, f, pickle.HIGHEST_PROTOCOL)
+            else:
+                dump(data, f)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except (IOError, OSError, pickle.PicklingError, RuntimeError, TypeError):
+        # RuntimeError: Very deeply nested objects exceed the recursion limit.
+        # TypeError: Python 2 cannot pickle some objects (e.g. bound methods).
+        debug.warning('Could not write the cache file %s', path)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+    return True
@@ -7,53 +7,50 @@ from medi._compatibility import encoding, is_py3, u
 _inited = False
 
 
-def _lazy_colorama_init():
-    """
-    Lazily init colorama if necessary, not to screw up stdout if debugging is
-    not enabled.
+class _NoColors(object):
+    RED = ''
+    GREEN = ''
+    YELLOW = ''
+    MAGENTA = ''
+    RESET = ''
+    BLUE = ''
 
-    This version of the function does nothing.
-    """
+
+Fore = _NoColors
 
 
-try:
+def _lazy_colorama_init():
+    """
+    Lazily import and init colorama if necessary, not to screw up stdout if
+    debugging is not enabled. Importing colorama also takes a while, which
+    would slow down ``import medi``.
+    """
+    global _inited, Fore
+    if _inited:
+        return
+    _inited = True
     if os.name == 'nt':
         # Does not work on Windows, as pyreadline and colorama interfere
-        raise ImportError
-    else:
+        return
+
+    try:
         # Use colorama for nicer console output.
-        from colorama import Fore, init
+        from colorama import Fore as colorama_fore, init
         from colorama import initialise
+    except ImportError:
+        return
+
+    # pytest resets the stream at the end - causes troubles. Since after every
+    # output the stream is reset automatically we don't need this.
+    initialise.atexit_done = True
+    try:
+        init(strip=False)
+    except Exception:
+        # Colorama fails with initializing under vim and is buggy in version
+        # 0.3.6.
+        pass
+    Fore = colorama_fore
 
-        def _lazy_colorama_init():  # noqa: F811
-            """
-            Lazily init colorama if necessary, not to screw up stdout is
-            debug not enabled.
-
-            This version of the function does init colorama.
-            """
-            global _inited
-            if not _inited:
-                # pytest resets the stream at the end - causes troubles. Since
-                # after every output the stream is reset automatically we don't
-                # need this.
-                initialise.atexit_done = True
-                try:
-                    init(strip=False)
-                except Exception:
-                    # Colorama fails with initializing under vim and is buggy in
-                    # version 0.3.6.
-                    pass
-            _inited = True
-
-except ImportError:
-    class Fore(object):
-        RED = ''
-        GREEN = ''
-        YELLOW = ''
-        MAGENTA = ''
-        RESET = ''
-        BLUE = ''
 
 NOTICE = object()
 WARNING = object()
@@ -133,8 +130,8 @@ def print_to_stdout(color, str_out):
 
     :param str color: A string that is an attribute of ``colorama.Fore``.
     """
-    col = getattr(Fore, color)
     _lazy_colorama_init()
+    col = getattr(Fore, color)
     if not is_py3:
         str_out = str_out.encode(encoding, 'replace')
     print(col + str_out + Fore.RESET)
@@ -62,18 +62,23 @@ I need to mention now that lazy type inference is really good because it
 only *inferes* what needs to be *inferred*. All the statements and modules
 that are not used are just being ignored.
 """
+import time
+from collections import OrderedDict
+
 import marso
-from medi.file_io import FileIO
+from medi.file_io import FileIO, KnownContentFileIO
 
 from medi import debug
 from medi import settings
 from medi.inference import imports
 from medi.inference import recursion
-from medi.inference.cache import inference_state_function_cache
+from medi.inference import parser_cache
+from medi.inference.grammar_cache import load_grammar
+from medi.inference.cache import inference_state_function_cache, remove_results
 from medi.inference import helpers
 from medi.inference.names import TreeNameDefinition
 from medi.inference.base_value import ContextualizedNode, \
-    ValueSet, iterate_values
+    ValueSet, NO_VALUES, iterate_values
 from medi.inference.value import ClassValue, FunctionValue
 from medi.inference.syntax_tree import infer_expr_stmt, \
     check_tuple_assignments, tree_name_to_values
@@ -90,8 +95,14 @@ class InferenceState(object):
         self.compiled_subprocess = environment.get_inference_state_subprocess(self)
         self.grammar = environment.get_grammar() # TTODO: this grammar is incorrect.
 
-        self.latest_grammar = marso.load_grammar(version='3.7')
+        self._latest_grammar = None
         self.memoize_cache = {}  # for memoize decorators
+        # Only needed if modules are invalidated, see `InferenceSession`.
+        self.track_dependencies = False
+        self.memoize_stack = []  # the module parts used by running memoized calls
+        # Dict[Value, Dict[Optional[Node], Set[Tuple[function, tuple]]]]
+        self.memoize_dependents = {}
+        self.memoize_lru = OrderedDict()  # see settings.memoize_cache_size
         self.module_cache = imports.ModuleCache()  # does the job of `sys.modules`.
         self.stub_module_cache = {}  # Dict[Tuple[str, ...], Optional[ModuleValue]]
         self.compiled_cache = {}  # see `inference.compiled.create()`
@@ -104,6 +115,9 @@ class InferenceState(object):
         self.access_cache = {}
         self.allow_descriptor_getattr = False
         self.flow_analysis_enabled = True
+        self.cancellation_token = None
+        self.deadline = None  # see set_time_budget
+        self.timed_out = False
 
         self.reset_recursion_limitations()
 
@@ -114,12 +128,24 @@ class InferenceState(object):
     @staticmethod
     @plugin_manager.decorate()
     def execute(value, arguments):
+        inference_state = value.inference_state
+        inference_state.check_cancelled()
+        if inference_state.deadline is not None and inference_state.is_out_of_time():
+            return NO_VALUES
         debug.dbg('execute: %s %s', value, arguments)
         with debug.increase_indent_cm():
             value_set = value.py__call__(arguments=arguments)
         debug.dbg('execute result: %s in %s', value_set, value)
         return value_set
 
+    @property
+    def latest_grammar(self):
+        # Only needed for stubs and docstrings. Loading a grammar takes a
+        # while, so don't do it for every inference state.
+        if self._latest_grammar is None:
+            self._latest_grammar = load_grammar(version='3.7')
+        return self._latest_grammar
+
     @property
     @inference_state_function_cache()
     def builtins_module(self):
@@ -139,6 +165,78 @@ class InferenceState(object):
         self.recursion_detector = recursion.RecursionDetector()
         self.execution_recursion_detector = recursion.ExecutionRecursionDetector(self)
 
+    def reset_request_state(self):
+        """
+        Resets everything that is limited per request, so an inference state
+        can be reused by another :class:`.Script` (see
+        :class:`.InferenceSession`). Caches are kept.
+        """
+        self.inferred_element_counts = {}
+        self.analysis = []
+        self.dynamic_params_depth = 0
+        self.flow_analysis_enabled = True
+        self.set_time_budget(None)
+        self.reset_recursion_limitations()
+
+    def check_cancelled(self):
+        """
+        A checkpoint for cooperative cancellation, see :class:`.AsyncScript`.
+
+        :raises Cancelled: If the current request has been cancelled.
+        """
+        token = self.cancellation_token
+        if token is not None:
+            token.raise_if_cancelled()
+
+    def set_time_budget(self, milliseconds):
+        """
+        Limits the time of the current request. Once the time is up, nodes are
+        not inferred and functions are not executed anymore, which means that
+        the request returns the (partial) results it has found so far.
+
+        :param milliseconds: The budget, None means no limit.
+        """
+        if milliseconds is None:
+            self.deadline = None
+        else:
+            self.deadline = time.time() + milliseconds / 1000.0
+        self.timed_out = False
+
+    def is_out_of_time(self):
+        if self.timed_out:
+            return True
+        if self.deadline is not None and time.time() > self.deadline:
+            debug.warning('Time budget exceeded, results are incomplete')
+            self.timed_out = True
+        return self.timed_out
+
+    def invalidate_module(self, module, changed_nodes=None):
+        """
+        Removes a module from the caches. This is used when the code of a
+        module changed. Memoized results that were derived from the module are
+        removed as well, while all the other results, modules, stubs and
+        compiled objects are kept.
+
+        :param changed_nodes: If only some children of the module node (e.g.
+            functions) changed, the module is kept and only the results that
+            depend on these nodes or on all the code of the module are removed.
+        """
+        if changed_nodes is None:
+            self.module_cache.remove_module(module)
+            for key, stub_module in list(self.stub_module_cache.items()):
+                if stub_module is module:
+                    del self.stub_module_cache[key]
+            nodes = None
+        else:
+            nodes = [None] + list(changed_nodes)
+        results = set()
+        # See medi.inference.cache for the parts of a module.
+        for key in (module, getattr(module, 'tree_node', None)):
+            for node, part_results in self.memoize_dependents.get(key, {}).items():
+                if nodes is None or node in nodes:
+                    results |= part_results
+        remove_results(self, results)
+
     def get_sys_path(self, **kwargs):
         """Convenience function"""
         return self.project._get_sys_path(self, **kwargs)
@@ -191,6 +289,12 @@ class InferenceState(object):
             code = code[:settings._cropped_file_size]
 
         grammar = self.latest_grammar if use_latest_grammar else self.grammar
+        if kwargs.pop('cache', False):
+            if file_io is None and path is not None:
+                file_io = KnownContentFileIO(path, code)
+            if file_io is not None and file_io.path is not None:
+                module_node = parser_cache.parse(grammar, code, file_io, **kwargs)
+                return module_node, code
         return grammar.parse(code=code, path=path, file_io=file_io, **kwargs), code
 
     def parse(self, *args, **kwargs):
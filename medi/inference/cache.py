@@ -2,13 +2,319 @@
 - the popular ``_memoize_default`` works like a typical memoize and returns the
   default otherwise.
 - ``CachedMetaClass`` uses ``_memoize_default`` to do the same with classes.
+
+Every memoized result records the parts of the modules it was derived from:
+the parts of the values and contexts it was called with or returned (including
+the code their arguments come from, e.g. the call of a function execution) and
+the parts of all memoized results that were used while computing it. A part is
+a
+``(module, node)`` tuple, where ``node`` is
+
+- a child of the module node (e.g. a function or a class), if a result only
+  depends on that definition,
+- the module node itself for results that depend on the module level
+  statements (e.g. the imports),
+- None for results that depend on all the code of the module (e.g. the search
+  for dynamic params, see :func:`add_module_dependency`).
+
+Results that are only called with nodes of a module (and not with one of its
+values or contexts) use the module node instead of the module.
+
+This allows :meth:`.InferenceState.invalidate_module` to only remove the
+results that depend on a changed module or on the changed definitions of a
+module. Dependencies are only tracked if
+:attr:`.InferenceState.track_dependencies` is set (by an
+:class:`.InferenceSession`), because inference states of single scripts are
+never invalidated.
+
+Results that are computed after the time budget of a request ran out (see
+:meth:`.InferenceState.set_time_budget`) are not memoized, because they might
+be incomplete.
+
+If :attr:`medi.settings.memoize_cache_size` (or
+:attr:`medi.settings.session_memoize_cache_size` for sessions) is set, the
+least recently used results are removed once there are more results than that.
+Results that are still being computed are never removed, because their default
+values prevent recursion.
 """
+import sys
 from functools import wraps
 
+from marso.tree import NodeOrLeaf
+
 from medi import debug
+from medi import settings
 
 _NO_DEFAULT = object()
 _RECURSION_SENTINEL = object()
+_NO_DEPENDENCIES = frozenset()
+
+
+_classes = None
+
+
+def _get_classes():
+    # Imported lazily, because the values use the decorators of this module.
+    global _classes
+    if _classes is None:
+        from medi.inference.base_value import HelperValueMixin, ValueSet
+        from medi.inference.context import AbstractContext
+        from medi.inference.arguments import _AbstractArgumentsMixin
+        _classes = HelperValueMixin, AbstractContext, ValueSet, _AbstractArgumentsMixin
+    return _classes
+
+
+def _get_module(obj):
+    """
+    Returns the module of a value or a context. Attributes are not looked up
+    with ``__getattr__``, because value wrappers would infer their wrapped
+    values.
+    """
+    try:
+        parent_context = object.__getattribute__(obj, 'parent_context')
+    except AttributeError:
+        return None
+    if parent_context is not None:
+        value = parent_context.get_root_context().get_value()
+    elif isinstance(obj, _get_classes()[1]):
+        value = obj.get_value()
+    else:
+        value = obj
+    if value.is_module():
+        return value
+    return None
+
+
+def _get_top_level_node(node):
+    """
+    Returns the child of the module node that contains ``node`` or None if
+    ``node`` is the module node.
+    """
+    top_level_node = None
+    while node.parent is not None:
+        top_level_node = node
+        node = node.parent
+    return top_level_node
+
+
+def _get_tree_node(obj):
+    try:
+        return object.__getattribute__(obj, 'tree_node')
+    except AttributeError:
+        # Compiled objects and value wrappers.
+        return None
+
+
+def _get_arguments(obj):
+    try:
+        return object.__getattribute__(obj, '_arguments')
+    except AttributeError:
+        # Not an execution or an instance.
+        return None
+
+
+def _get_part(obj, module):
+    tree_node = _get_tree_node(obj)
+    module_node = _get_tree_node(module)
+    if tree_node is None or module_node is None:
+        return None
+    return _get_top_level_node(tree_node) or module_node
+
+
+def _unpack_arguments(arguments, objects):
+    """
+    Adds the contexts and values ``arguments`` come from together with the
+    nodes they refer to to ``objects``. The arguments of an execution or an instance are
+    usually defined somewhere else than the function or the class, e.g. in
+    another module.
+    """
+    wrapped = getattr(arguments, '_wrapped_arguments', None)
+    if wrapped is not None:
+        objects.append((wrapped, None))
+        instance = getattr(arguments, 'instance', None)
+        if instance is not None:
+            objects.append((instance, None))
+        return
+    if arguments.context is not None:
+        objects.append((arguments.context, arguments.argument_node or arguments.trailer))
+    for values in getattr(arguments, '_values_list', ()):
+        objects.extend((value, None) for value in values)
+
+
+def _get_dependencies(obj, args):
+    value_class, context_class, _, arguments_class = _get_classes()
+    dependencies = set()
+    module_level = []
+    objects = [(o, None) for o in (obj,) + args]
+    seen = set()
+    while objects:
+        o, node = objects.pop()
+        if isinstance(o, arguments_class):
+            _unpack_arguments(o, objects)
+        elif isinstance(o, (value_class, context_class)) and id(o) not in seen:
+            seen.add(id(o))
+            arguments = _get_arguments(o)
+            if arguments is not None:
+                objects.append((arguments, None))
+            module = _get_module(o)
+            if module is not None:
+                part = _get_part(o, module)
+                if part is not None and part.parent is None:
+                    if node is None:
+                        module_level.append(module)
+                    else:
+                        # The module level code that contains the arguments.
+                        dependencies.add((module, _get_top_level_node(node) or part))
+                else:
+                    dependencies.add((module, part))
+
+    # Module level contexts are usually called with the node they work on,
+    # e.g. when inferring the nodes of a module level statement or the
+    # decorators of a function.
+    top_level_nodes = [_get_top_level_node(a) for a in args if isinstance(a, NodeOrLeaf)]
+    for module in module_level:
+        module_node = _get_tree_node(module)
+        parts = [n for n in top_level_nodes if n is not None and n.parent is module_node]
+        if not parts:
+            parts = [module_node]
+        for part in parts:
+            dependencies.add((module, part))
+
+    # Nodes without a context of their module (e.g. for functions that only
+    # get the inference state) depend on the module node instead.
+    module_nodes = set(_get_tree_node(module) for module, part in dependencies)
+    for node in args:
+        if isinstance(node, NodeOrLeaf):
+            module_node = node.get_root_node()
+            if module_node not in module_nodes:
+                dependencies.add((module_node, _get_top_level_node(node) or module_node))
+    return dependencies
+
+
+def _get_result_dependencies(result):
+    if isinstance(result, (_get_classes()[2], list, tuple)):
+        return _get_dependencies(None, tuple(result))
+    return _get_dependencies(result, ())
+
+
+def _add_dependencies(inference_state, function, key, dependencies):
+    """
+    Registers a memoized result, so it can be removed once one of the module
+    parts in ``dependencies`` changes, and passes them on to the result that
+    is being computed.
+    """
+    dependents = inference_state.memoize_dependents
+    for module, part in dependencies:
+        dependents.setdefault(module, {}).setdefault(part, set()).add((function, key))
+    stack = inference_state.memoize_stack
+    if stack:
+        stack[-1].update(dependencies)
+
+
+def add_module_dependency(context):
+    """
+    Makes the memoized result that is currently computed depend on all the
+    code of the module of ``context``. This is needed for results that search
+    the whole module, because their arguments only refer to some parts of it.
+    """
+    module = _get_module(context)
+    stack = context.inference_state.memoize_stack
+    if module is not None and stack:
+        stack[-1].add((module, None))
+
+
+def _get_cache_size(inference_state):
+    if inference_state.track_dependencies:
+        # Only sessions track dependencies, see InferenceSession.
+        return settings.session_memoize_cache_size
+    return settings.memoize_cache_size
+
+
+def _add_to_lru(inference_state, function, key):
+    size = _get_cache_size(inference_state)
+    if size is None:
+        return
+    inference_state.memoize_lru[function, key] = True
+    _evict(inference_state, size)
+
+
+def _mark_used(inference_state, function, key):
+    if _get_cache_size(inference_state) is None:
+        return
+    lru = inference_state.memoize_lru
+    lru_key = function, key
+    # Results that are not in the LRU are still being computed.
+    if lru.pop(lru_key, False):
+        lru[lru_key] = True
+
+
+def _is_running(entry):
+    if len(entry) == 3:
+        # A generator that is currently generating its next element.
+        cached_lst = entry[1]
+        return bool(cached_lst) and cached_lst[-1] is _RECURSION_SENTINEL
+    return False
+
+
+def remove_results(inference_state, results):
+    """
+    Removes memoized results, given as ``(function, key)`` tuples, from the
+    cache, the LRU and the dependents of all the parts they depend on.
+    """
+    cache = inference_state.memoize_cache
+    dependents = inference_state.memoize_dependents
+    for result in results:
+        function, key = result
+        inference_state.memoize_lru.pop(result, None)
+        entry = cache.get(function, {}).pop(key, None)
+        if entry is None:
+            continue
+        for module, part in entry[-1]:
+            parts = dependents.get(module)
+            if parts is None or part not in parts:
+                continue
+            parts[part].discard(result)
+            if not parts[part]:
+                del parts[part]
+                if not parts:
+                    del dependents[module]
+
+
+def _evict(inference_state, size):
+    lru = inference_state.memoize_lru
+    cache = inference_state.memoize_cache
+    running = []
+    while len(lru) + len(running) > size and lru:
+        lru_key, _ = lru.popitem(last=False)
+        function, key = lru_key
+        entry = cache.get(function, {}).get(key)
+        if entry is None:
+            continue
+        if _is_running(entry):
+            running.append(lru_key)
+            continue
+        remove_results(inference_state, [lru_key])
+
+    for lru_key in running:
+        lru[lru_key] = True
+
+
+def get_memoize_cache_statistics(inference_state):
+    """
+    Returns a list of ``(function name, number of results, bytes)`` tuples
+    for all memoized functions, largest first. The number of bytes is only an
+    approximation, because it just includes the keys and the result containers
+    and not the values they refer to.
+    """
+    result = []
+    for function, memo in inference_state.memoize_cache.items():
+        size = sys.getsizeof(memo)
+        for key, entry in memo.items():
+            size += sys.getsizeof(key) + sys.getsizeof(entry) \
+                + sys.getsizeof(entry[0])
+        name = getattr(function, '__qualname__', function.__name__)
+        result.append((name, len(memo), size))
+    return sorted(result, key=lambda t: t[2], reverse=True)
 
 
 def _memoize_default(default=_NO_DEFAULT, inference_state_is_first_arg=False,
@@ -24,11 +330,12 @@ def _memoize_default(default=_NO_DEFAULT, inference_state_is_first_arg=False,
         def wrapper(obj, *args, **kwargs):
             # TODO These checks are kind of ugly and slow.
             if inference_state_is_first_arg:
-                cache = obj.memoize_cache
+                inference_state = obj
             elif second_arg_is_inference_state:
-                cache = args[0].memoize_cache  # needed for meta classes
+                inference_state = args[0]  # needed for meta classes
             else:
-                cache = obj.inference_state.memoize_cache
+                inference_state = obj.inference_state
+            cache = inference_state.memoize_cache
 
             try:
                 memo = cache[function]
@@ -37,12 +344,47 @@ def _memoize_default(default=_NO_DEFAULT, inference_state_is_first_arg=False,
 
             key = (obj, args, frozenset(kwargs.items()))
             if key in memo:
-                return memo[key]
+                rv, dependencies = memo[key]
+                stack = inference_state.memoize_stack
+                if stack and dependencies:
+                    stack[-1].update(dependencies)
+                _mark_used(inference_state, function, key)
+                return rv
             else:
                 if default is not _NO_DEFAULT:
-                    memo[key] = default
-                rv = function(obj, *args, **kwargs)
-                memo[key] = rv
+                    memo[key] = default, _NO_DEPENDENCIES
+                track = inference_state.track_dependencies
+                if track:
+                    dependencies = set()
+                    inference_state.memoize_stack.append(dependencies)
+                try:
+                    rv = function(obj, *args, **kwargs)
+                except BaseException:
+                    # Don't keep the recursion default as a result, e.g. if
+                    # the request has been cancelled.
+                    if default is not _NO_DEFAULT:
+                        memo.pop(key, None)
+                    raise
+                finally:
+                    if track:
+                        inference_state.memoize_stack.pop()
+                if inference_state.timed_out:
+                    # The result might be incomplete.
+                    memo.pop(key, None)
+                    return rv
+                if track:
+                    if inference_state_is_first_arg or second_arg_is_inference_state:
+                        # The first argument is not a value.
+                        dependencies.update(_get_dependencies(None, args))
+                    else:
+                        dependencies.update(_get_dependencies(obj, args))
+                    dependencies.update(_get_result_dependencies(rv))
+                    dependencies = frozenset(dependencies)
+                    _add_dependencies(inference_state, function, key, dependencies)
+                else:
+                    dependencies = _NO_DEPENDENCIES
+                memo[key] = rv, dependencies
+                _add_to_lru(inference_state, function, key)
                 return rv
         return wrapper
 
@@ -89,20 +431,26 @@ def inference_state_method_generator_cache():
     def func(function):
         @wraps(function)
         def wrapper(obj, *args, **kwargs):
-            cache = obj.inference_state.memoize_cache
+            inference_state = obj.inference_state
+            cache = inference_state.memoize_cache
             try:
                 memo = cache[function]
             except KeyError:
                 cache[function] = memo = {}
 
             key = (obj, args, frozenset(kwargs.items()))
+            track = inference_state.track_dependencies
 
             if key in memo:
-                actual_generator, cached_lst = memo[key]
+                actual_generator, cached_lst, dependencies = memo[key]
+                _mark_used(inference_state, function, key)
             else:
                 actual_generator = function(obj, *args, **kwargs)
                 cached_lst = []
-                memo[key] = actual_generator, cached_lst
+                dependencies = _get_dependencies(obj, args) if track else set()
+                memo[key] = actual_generator, cached_lst, dependencies
+                _add_dependencies(inference_state, function, key, dependencies)
+                _add_to_lru(inference_state, function, key)
 
             i = 0
             while True:
@@ -114,11 +462,38 @@ def inference_state_method_generator_cache():
                         return
                 except IndexError:
                     cached_lst.append(_RECURSION_SENTINEL)
-                    next_element = next(actual_generator, None)
+                    # The elements are generated lazily, so the dependencies
+                    # of the generator grow with every element.
+                    new_dependencies = set()
+                    if track:
+                        inference_state.memoize_stack.append(new_dependencies)
+                    try:
+                        next_element = next(actual_generator, None)
+                    except BaseException:
+                        # The generator cannot be resumed anymore.
+                        cached_lst.pop()
+                        remove_results(inference_state, [(function, key)])
+                        raise
+                    finally:
+                        if track:
+                            inference_state.memoize_stack.pop()
+                    if inference_state.timed_out:
+                        # The elements might be incomplete.
+                        remove_results(inference_state, [(function, key)])
+                    if track:
+                        new_dependencies -= dependencies
+                        if next_element is not None:
+                            new_dependencies |= _get_result_dependencies(next_element)
+                            new_dependencies -= dependencies
+                        _add_dependencies(inference_state, function, key, new_dependencies)
+                        dependencies.update(new_dependencies)
                     if next_element is None:
                         cached_lst.pop()
                         return
                     cached_lst[-1] = next_element
+                stack = inference_state.memoize_stack
+                if stack:
+                    stack[-1].update(dependencies)
                 yield next_element
                 i += 1
         return wrapper
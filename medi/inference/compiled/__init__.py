@@ -2,6 +2,7 @@ from medi._compatibility import unicode
 from medi.inference.compiled.value import CompiledValue, CompiledName, \
     CompiledValueFilter, CompiledValueName, create_from_access_path
 from medi.inference.base_value import LazyValueWrapper
+from medi.inference.cache import inference_state_function_cache
 
 
 def builtin_from_name(inference_state, string):
@@ -46,11 +47,26 @@ def create_simple_object(inference_state, obj):
     versions.
     """
     assert type(obj) in (int, float, str, bytes, unicode, slice, complex, bool), obj
-    compiled_value = create_from_access_path(
+    if type(obj) is slice:
+        # Slices are not hashable.
+        compiled_value = _create_simple_compiled_value(inference_state, obj)
+    else:
+        compiled_value = _create_cached_simple_compiled_value(inference_state, type(obj), obj)
+    return ExactValue(compiled_value)
+
+
+def _create_simple_compiled_value(inference_state, obj):
+    return create_from_access_path(
         inference_state,
         inference_state.compiled_subprocess.create_simple_object(obj)
     )
-    return ExactValue(compiled_value)
+
+
+@inference_state_function_cache()
+def _create_cached_simple_compiled_value(inference_state, type_, obj):
+    # The type is part of the cache key, because e.g. 1 == 1.0 == True. Every
+    # creation would otherwise create a new object in the subprocess.
+    return _create_simple_compiled_value(inference_state, obj)
 
 
 def get_string_value_set(inference_state):
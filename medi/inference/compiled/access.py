@@ -551,6 +551,35 @@ class DirectObjectAccess(object):
         )
         return self.needs_type_completions(), tuples
 
+    def get_member_table(self):
+        """
+        Like :meth:`get_dir_infos`, but also returns what is needed to complete
+        the attributes, so big modules don't need a call per attribute.
+
+        :returns: ``needs_type_completions`` and a list of ``(name,
+            allowed_getattr, member)`` tuples. ``member`` is None if the
+            attribute cannot be accessed safely, otherwise it is a tuple of the
+            result of :meth:`getattr_paths`, the API type, the name, the
+            docstring and the safe value of the attribute (a tuple that is
+            empty if the value is not simple).
+        """
+        needs_type_completions, dir_infos = self.get_dir_infos()
+        members = []
+        for name, allowed_getattr in dir_infos.items():
+            member = None
+            has_attribute, is_descriptor = allowed_getattr
+            if has_attribute and not is_descriptor:
+                paths = self.getattr_paths(name, default=None)
+                access = paths[-1].access
+                try:
+                    safe_value = access.get_safe_value(),
+                except ValueError:
+                    safe_value = ()
+                member = (paths, access.get_api_type(), access.py__name__(),
+                          access.py__doc__(), safe_value)
+            members.append((name, allowed_getattr, member))
+        return needs_type_completions, members
+
 
 def _is_class_instance(obj):
     """Like inspect.* methods."""
@@ -0,0 +1,136 @@
+"""
+Persists the member tables (see :meth:`.DirectObjectAccess.get_member_table`)
+of compiled modules and their classes to :attr:`medi.settings.cache_directory`.
+
+Introspecting big extension modules (e.g. ``builtins`` or the modules of numpy)
+and their classes (e.g. ``str``) used to be repeated by every process. Entries
+are keyed by the hash of the executable of the environment, the name and the
+path of the module that owns them and the names of the classes. They contain
+the modification time of the module's file, so they are ignored once the
+module or the environment changes. Instances are not cached, because their
+attributes can differ from the ones of their class.
+
+Access handles are only valid within a subprocess and are therefore not part of
+the entries. The names, API types and docstrings of the members are read from
+the entry, but inferring a member still accesses it in the subprocess.
+"""
+import os
+import hashlib
+
+from medi import debug
+from medi import settings
+from medi._compatibility import pickle, pickle_load
+from medi.cache import get_version_tag, dump_atomically
+
+_CACHE_VERSION = 1
+
+_VERSION_TAG = get_version_tag(_CACHE_VERSION)
+
+# Dict[str, Tuple[key, table]]
+_tables = {}
+
+
+def _get_entry_path(environment, module_name, module_path, class_names=()):
+    h = hashlib.sha256(environment._sha256.encode('utf-8'))
+    h.update(module_name.encode('utf-8'))
+    # Modules with the same name might be in different sys.path entries.
+    h.update(repr(module_path).encode('utf-8'))
+    for name in class_names:
+        h.update(b'.' + name.encode('utf-8'))
+    return os.path.join(
+        settings.cache_directory,
+        'member_tables',
+        _VERSION_TAG,
+        h.hexdigest() + '.pkl'
+    )
+
+
+def _get_key(path):
+    """
+    Returns the modification time of the module's file or None for builtin
+    modules. Raises OSError if the file does not exist anymore.
+    """
+    if path is None:
+        # Part of the executable, which is covered by the environment hash.
+        return None
+    return os.path.getmtime(path)
+
+
+def _load(path, key):
+    try:
+        entry_key, table = _tables[path]
+    except KeyError:
+        pass
+    else:
+        if entry_key == key:
+            return table
+        # The module changed while this process is running.
+        del _tables[path]
+
+    try:
+        with open(path, 'rb') as f:
+            entry_key, table = pickle_load(f)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    if entry_key != key:
+        return None
+    _tables[path] = key, table
+    return table
+
+
+def _save(path, key, table):
+    _tables[path] = key, table
+    dump_atomically(path, (key, table))
+
+
+def _get_owner(value):
+    """
+    Returns the module that owns a compiled module or class and the names of
+    the classes that lead to ``value`` from there. Returns None for other
+    values, e.g. for functions or classes that are not module attributes.
+    """
+    class_names = []
+    while value.parent_context is not None:
+        if value.api_type != 'class':
+            return None
+        class_names.insert(0, value.py__name__())
+        value = value.parent_context.get_value()
+        if getattr(value, 'access_handle', None) is None:
+            # Not a compiled value.
+            return None
+    return value, tuple(class_names)
+
+
+def get_member_table(inference_state, value):
+    """
+    Returns the member table of a compiled module or class, either from the
+    cache or from the subprocess. The ``member`` tuples of cached tables don't
+    have access paths, their first item is None.
+    """
+    owner = _get_owner(value)
+    module_name = None
+    if owner is not None:
+        module, class_names = owner
+        module_name = module.py__name__()
+        module_path = module.py__file__()
+        try:
+            key = module_name, _get_key(module_path)
+        except OSError:
+            module_name = None
+    if module_name is None or None in class_names:
+        return value.access_handle.get_member_table()
+
+    path = _get_entry_path(inference_state.environment, module_name, module_path,
+                           class_names)
+    table = _load(path, key)
+    if table is not None:
+        debug.dbg('Loaded the member table of %s from the cache',
+                  '.'.join((module_name,) + class_names))
+        return table
+
+    needs_type_completions, members = value.access_handle.get_member_table()
+    _save(path, key, (needs_type_completions, [
+        (name, allowed_getattr, None if member is None else (None,) + member[1:])
+        for name, allowed_getattr, member in members
+    ]))
+    return needs_type_completions, members
@@ -5,16 +5,25 @@ goals:
 1. Making it safer - Segfaults and RuntimeErrors as well as stdout/stderr can
    be ignored and dealt with.
 2. Make it possible to handle different Python versions as well as virtualenvs.
+
+The parent sends pickled ``(request_id, calls)`` tuples to the subprocess,
+where ``calls`` is a list of ``(inference_state_id, function, args, kwargs)``
+tuples. The subprocess answers with ``(request_id, results)`` and one
+``(is_exception, traceback, result)`` tuple per call. The deletions of old
+inference states are sent with the next call instead of needing their own
+round trips.
 """
 
 import os
+import gc
 import sys
 import subprocess
 import socket
+import time
 import errno
 import traceback
 from functools import partial
-from threading import Thread
+from threading import Thread, Lock, Event
 try:
     from queue import Queue, Empty
 except ImportError:
@@ -23,6 +32,7 @@ except ImportError:
 from medi._compatibility import queue, is_py3, force_unicode, \
     pickle_dump, pickle_load, GeneralizedPopen, weakref
 from medi import debug
+from medi import settings
 from medi.cache import memoize_method
 from medi.inference.compiled.subprocess import functions
 from medi.inference.compiled.access import DirectObjectAccess, AccessPath, \
@@ -31,6 +41,17 @@ from medi.api.exceptions import InternalError
 
 
 _MAIN_PATH = os.path.join(os.path.dirname(__file__), '__main__.py')
+_DELETION_INTERVAL = 0.5
+"""
+Seconds to wait after an inference state has been garbage collected before it
+is deleted in the subprocess, so that deletions are sent together. The waiting
+starts again if another inference state is garbage collected in the meantime.
+"""
+_MAX_DELETION_DELAY = 5
+"""
+Seconds after which deletions are sent even if inference states are still
+being garbage collected.
+"""
 
 
 def _enqueue_output(out, queue):
@@ -54,7 +75,9 @@ def _get_function(name):
     return getattr(functions, name)
 
 
-def _cleanup_process(process, thread):
+def _cleanup_process(process, thread, deletions_queued):
+    # Wakes up the deletion thread, so it can stop.
+    deletions_queued.set()
     try:
         process.kill()
         process.wait()
@@ -108,6 +131,7 @@ class InferenceStateSubprocess(_InferenceStateProcess):
         super(InferenceStateSubprocess, self).__init__(inference_state)
         self._used = False
         self._compiled_subprocess = compiled_subprocess
+        compiled_subprocess.add_inference_state(self._inference_state_id)
 
     def __getattr__(self, name):
         func = _get_function(name)
@@ -147,19 +171,50 @@ class InferenceStateSubprocess(_InferenceStateProcess):
         return obj
 
     def __del__(self):
-        if self._used and not self._compiled_subprocess.is_crashed:
-            self._compiled_subprocess.delete_inference_state(self._inference_state_id)
+        if not self._compiled_subprocess.is_crashed:
+            self._compiled_subprocess.delete_inference_state(
+                self._inference_state_id,
+                used=self._used,
+            )
+
+
+def _delete_inference_states(subprocess_ref, deletions_queued):
+    while True:
+        deletions_queued.wait()
+        deletions_queued.clear()
+        # Deleting a lot of scripts in a row should only need one request.
+        deadline = time.time() + _MAX_DELETION_DELAY
+        while deletions_queued.wait(_DELETION_INTERVAL) and time.time() < deadline:
+            deletions_queued.clear()
+        compiled_subprocess = subprocess_ref()
+        if compiled_subprocess is None or compiled_subprocess.is_crashed:
+            return
+        compiled_subprocess.flush_deletions()
+        # Don't keep the subprocess alive while sleeping.
+        del compiled_subprocess
 
 
 class CompiledSubprocess(object):
     is_crashed = False
+    is_retired = False
     # Start with 2, gets set after _get_info.
     _pickle_protocol = 2
 
     def __init__(self, executable):
         self._executable = executable
         self._inference_state_deletion_queue = queue.deque()
+        self._inference_state_ids = set()
         self._cleanup_callable = lambda: None
+        self._request_id = 0
+        # Requests and their answers must not interleave if the subprocess is
+        # used by multiple threads.
+        self._lock = Lock()
+        self._deletions_queued = Event()
+        self.crash_callback = None
+        self.stats = None
+        """
+        The result of the last :meth:`get_stats` call or None.
+        """
 
     def __repr__(self):
         pid = os.getpid()
@@ -180,6 +235,8 @@ class CompiledSubprocess(object):
             _MAIN_PATH,
             os.path.dirname(os.path.dirname(marso_path)),
             '.'.join(str(x) for x in sys.version_info[:3]),
+            # The subprocess uses the same caches (e.g. for grammars).
+            settings.cache_directory,
         )
         # Use explicit envionment to ensure reliable results (#1540)
         env = {}
@@ -207,43 +264,130 @@ class CompiledSubprocess(object):
         )
         t.daemon = True
         t.start()
+        deletion_thread = Thread(
+            target=_delete_inference_states,
+            args=(weakref.ref(self), self._deletions_queued)
+        )
+        deletion_thread.daemon = True
+        deletion_thread.start()
         # Ensure the subprocess is properly cleaned up when the object
         # is garbage collected.
         self._cleanup_callable = weakref.finalize(self,
                                                   _cleanup_process,
                                                   process,
-                                                  t)
+                                                  t,
+                                                  self._deletions_queued)
         return process
 
     def run(self, inference_state, function, args=(), kwargs={}):
-        # Delete old inference_states.
+        assert callable(function)
+        return self._send(id(inference_state), function, args, kwargs)
+
+    def _pop_deletions(self):
+        deletions = []
         while True:
             try:
                 inference_state_id = self._inference_state_deletion_queue.pop()
             except IndexError:
-                break
-            else:
-                self._send(inference_state_id, None)
+                return deletions
+            deletions.append((inference_state_id, None, (), {}))
 
-        assert callable(function)
-        return self._send(id(inference_state), function, args, kwargs)
+    def get_stats(self):
+        """
+        Returns a dict with the number of ``inference_states`` and
+        ``access_handles`` in the subprocess and its resident memory (``rss``)
+        in bytes (None if it's not available on this platform). Pending
+        deletions are sent first.
+        """
+        self.stats = result = self._send(None, functions.get_stats)
+        return result
 
     def get_sys_path(self):
         return self._send(None, functions.get_sys_path, (), {})
 
+    def warm_up(self):
+        """
+        Starts the subprocess and imports the modules that are needed for
+        inference, so the first real request does not have to wait.
+        """
+        self._send(None, functions.warm_up)
+
     def _kill(self):
+        self._stop()
+        self._report_crash()
+
+    def _stop(self):
         self.is_crashed = True
         self._cleanup_callable()
 
+    def _report_crash(self):
+        # Never call this while holding self._lock: The crash callback of a
+        # pool takes the lock of the pool and the pool takes self._lock in
+        # get_subprocess.
+        if self.crash_callback is not None:
+            self.crash_callback(self)
+
+    def retire(self):
+        """
+        Stops the subprocess once the inference states that are using it are
+        deleted. It should not be used for new inference states.
+        """
+        self.is_retired = True
+        self._shutdown_if_retired()
+
+    def _shutdown_if_retired(self):
+        # Don't stop the subprocess while another thread is using it.
+        with self._lock:
+            if self.is_retired and not self._inference_state_ids and not self.is_crashed:
+                debug.dbg('Stopping retired subprocess %s', self._executable)
+                self._stop()
+
     def _send(self, inference_state_id, function, args=(), kwargs={}):
+        try:
+            with self._lock:
+                was_crashed = self.is_crashed
+                # Old inference states are deleted with the same message.
+                deletions = self._pop_deletions()
+                results = self._communicate(
+                    deletions + [(inference_state_id, function, args, kwargs)]
+                )
+        except InternalError:
+            if self.is_crashed and not was_crashed:
+                self._report_crash()
+            raise
+        is_exception, result = results[-1]
+        if is_exception:
+            raise result
+        return result
+
+    def flush_deletions(self):
+        """
+        Deletes the inference states that are not used anymore in the
+        subprocess and updates :attr:`stats`. This happens in a background
+        thread, so idle subprocesses give their memory back.
+        """
+        if self._inference_state_deletion_queue:
+            try:
+                self.get_stats()
+            except InternalError:
+                # The subprocess crashed and was replaced.
+                pass
+        self._shutdown_if_retired()
+
+    def _communicate(self, calls):
         if self.is_crashed:
             raise InternalError("The subprocess %s has crashed." % self._executable)
 
         if not is_py3:
             # Python 2 compatibility
-            kwargs = {force_unicode(key): value for key, value in kwargs.items()}
-
-        data = inference_state_id, function, args, kwargs
+            calls = [
+                (inference_state_id, function, args,
+                 {force_unicode(key): value for key, value in kwargs.items()})
+                for inference_state_id, function, args, kwargs in calls
+            ]
+
+        self._request_id += 1
+        data = self._request_id, calls
         try:
             pickle_dump(data, self._get_process().stdin, self._pickle_protocol)
         except (socket.error, IOError) as e:
@@ -253,18 +397,18 @@ class CompiledSubprocess(object):
             if e.errno not in (errno.EPIPE, errno.EINVAL):
                 # Not a broken pipe
                 raise
-            self._kill()
+            self._stop()
             raise InternalError("The subprocess %s was killed. Maybe out of memory?"
                                 % self._executable)
 
         try:
-            is_exception, traceback, result = pickle_load(self._get_process().stdout)
+            request_id, results = pickle_load(self._get_process().stdout)
         except EOFError as eof_error:
             try:
                 stderr = self._get_process().stderr.read().decode('utf-8', 'replace')
             except Exception as exc:
                 stderr = '<empty/not available (%r)>' % exc
-            self._kill()
+            self._stop()
             _add_stderr_to_debug(self._stderr_queue)
             raise InternalError(
                 "The subprocess %s has crashed (%r, stderr=%s)." % (
@@ -275,22 +419,131 @@ class CompiledSubprocess(object):
 
         _add_stderr_to_debug(self._stderr_queue)
 
-        if is_exception:
-            # Replace the attribute error message with a the traceback. It's
-            # way more informative.
-            result.args = (traceback,)
-            raise result
-        return result
+        if request_id != self._request_id:
+            self._stop()
+            raise InternalError(
+                "The subprocess %s answered request %s instead of %s." % (
+                    self._executable, request_id, self._request_id
+                ))
+
+        converted = []
+        for is_exception, traceback_string, result in results:
+            if is_exception:
+                # Replace the attribute error message with a the traceback.
+                # It's way more informative.
+                result.args = (traceback_string,)
+            converted.append((is_exception, result))
+        return converted
+
+    def add_inference_state(self, inference_state_id):
+        self._inference_state_ids.add(inference_state_id)
+
+    def delete_inference_state(self, inference_state_id, used=True):
+        """
+        Called when an inference state is garbage collected. The deletion is
+        sent with the next request or by a background thread, because this
+        might be called by the garbage collector while a request is running.
+
+        :param used: False if the inference state never used the subprocess.
+        """
+        self._inference_state_ids.discard(inference_state_id)
+        if used:
+            self._inference_state_deletion_queue.append(inference_state_id)
+        # A retired subprocess might be stopped now.
+        self._deletions_queued.set()
+
+
+class CompiledSubprocessPool(object):
+    """
+    A fixed number of subprocesses for the same executable. All the compiled
+    objects of an inference state live in one subprocess, so inference states
+    are distributed between the subprocesses, but each of them always uses the
+    same one. Threads using different inference states can therefore access
+    compiled objects in parallel.
+
+    All subprocesses are started and warmed up in the background. Crashed
+    subprocesses are replaced in the background as well, so the next inference
+    state does not have to wait for a cold start. The same happens to
+    subprocesses that use more memory than
+    :attr:`medi.settings.environment_subprocess_memory_limit`; they are
+    stopped once the inference states that use them are deleted.
+
+    :param first_subprocess: An already started subprocess.
+    :param create_subprocess: A callable that returns a new subprocess.
+    """
+    def __init__(self, first_subprocess, create_subprocess, size):
+        self._create_subprocess = create_subprocess
+        self._lock = Lock()
+        self._next_index = 0
+        self._subprocesses = [None] * max(size, 1)
+        self._set_subprocess(0, first_subprocess)
+        for index in range(1, len(self._subprocesses)):
+            self._spawn(index)
+
+    def __len__(self):
+        return len(self._subprocesses)
+
+    def _set_subprocess(self, index, compiled_subprocess):
+        compiled_subprocess.crash_callback = partial(self._replace, index)
+        self._subprocesses[index] = compiled_subprocess
+
+    def _spawn(self, index):
+        compiled_subprocess = self._create_subprocess()
+        self._set_subprocess(index, compiled_subprocess)
+        t = Thread(target=self._warm_up, args=(compiled_subprocess,))
+        t.daemon = True
+        t.start()
+        return compiled_subprocess
 
-    def delete_inference_state(self, inference_state_id):
+    def _warm_up(self, compiled_subprocess):
+        try:
+            compiled_subprocess.warm_up()
+        except InternalError:
+            # The crash callback has already spawned a replacement.
+            pass
+
+    def _replace(self, index, crashed_subprocess):
+        with self._lock:
+            if self._subprocesses[index] is crashed_subprocess:
+                debug.warning('Replacing crashed subprocess %s', crashed_subprocess)
+                self._spawn(index)
+
+    def get_subprocess(self, inference_state_id):
+        """
+        Returns the subprocess for a new inference state.
         """
-        Currently we are not deleting inference_state instantly. They only get
-        deleted once the subprocess is used again. It would probably a better
-        solution to move all of this into a thread. However, the memory usage
-        of a single inference_state shouldn't be that high.
+        retired = None
+        with self._lock:
+            index = self._next_index
+            self._next_index = (index + 1) % len(self._subprocesses)
+            compiled_subprocess = self._subprocesses[index]
+            if compiled_subprocess.is_crashed:
+                compiled_subprocess = self._spawn(index)
+            elif self._uses_too_much_memory(compiled_subprocess):
+                debug.warning('Recycling subprocess %s, it uses %s bytes',
+                              compiled_subprocess, compiled_subprocess.stats['rss'])
+                retired = compiled_subprocess
+                compiled_subprocess = self._spawn(index)
+        if retired is not None:
+            # Retiring takes the lock of the subprocess, see _report_crash.
+            retired.retire()
+        debug.dbg('Using subprocess %s for inference state %s',
+                  index, inference_state_id)
+        return compiled_subprocess
+
+    def _uses_too_much_memory(self, compiled_subprocess):
+        limit = settings.environment_subprocess_memory_limit
+        stats = compiled_subprocess.stats
+        return limit is not None and stats is not None \
+            and stats['rss'] is not None and stats['rss'] > limit
+
+    def get_stats(self):
         """
-        # With an argument - the inference_state gets deleted.
-        self._inference_state_deletion_queue.append(inference_state_id)
+        Returns :meth:`CompiledSubprocess.get_stats` for all subprocesses.
+        """
+        with self._lock:
+            subprocesses = list(self._subprocesses)
+        return [s.get_stats() for s in subprocesses]
 
 
 class Listener(object):
@@ -318,7 +571,9 @@ class Listener(object):
         return inference_state
 
     def _run(self, inference_state_id, function, args, kwargs):
-        if inference_state_id is None:
+        if function is functions.get_stats:
+            return function(self._inference_states, self._process)
+        elif inference_state_id is None:
             return function(*args, **kwargs)
         elif function is None:
             del self._inference_states[inference_state_id]
@@ -354,17 +609,26 @@ class Listener(object):
 
         while True:
             try:
-                payload = pickle_load(stdin)
+                request_id, calls = pickle_load(stdin)
             except EOFError:
                 # It looks like the parent process closed.
                 # Don't make a big fuss here and just exit.
                 exit(0)
-            try:
-                result = False, None, self._run(*payload)
-            except Exception as e:
-                result = True, traceback.format_exc(), e
-
-            pickle_dump(result, stdout, self._pickle_protocol)
+            results = []
+            for call in calls:
+                try:
+                    results.append((False, None, self._run(*call)))
+                except Exception as e:
+                    results.append((True, traceback.format_exc(), e))
+
+            pickle_dump((request_id, results), stdout, self._pickle_protocol)
+            called = [function for _, function, _, _ in calls]
+            if None in called and all(f in (None, functions.get_stats) for f in called):
+                # Only deletions are sent by the background thread of the
+                # parent, so the subprocess is probably idle. Inference states
+                # have a lot of reference cycles, collect them now (but not
+                # if only the stats were requested).
+                gc.collect()
 
 
 class AccessHandle(object):
@@ -407,6 +671,20 @@ class AccessHandle(object):
             return self._subprocess.get_compiled_method_return(self.id, name, *args, **kwargs)
         return self._cached_results(name, *args, **kwargs)
 
-    @memoize_method
+    def _get_results_cache(self):
+        # Not set in __init__, because handles are also created by unpickling.
+        return self.__dict__.setdefault('_results', {})
+
     def _cached_results(self, name, *args, **kwargs):
-        return self._subprocess.get_compiled_method_return(self.id, name, *args, **kwargs)
+        cache = self._get_results_cache()
+        key = name, args, frozenset(kwargs.items())
+        try:
+            return cache[key]
+        except KeyError:
+            result = self._subprocess.get_compiled_method_return(
+                self.id, name, *args, **kwargs)
+            cache[key] = result
+            return result
+
+    def _set_cached_result(self, name, args, kwargs, result):
+        self._get_results_cache()[name, args, frozenset(kwargs.items())] = result
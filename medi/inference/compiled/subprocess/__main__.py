@@ -45,8 +45,10 @@ else:
     load('medi')
     from medi.inference.compiled import subprocess  # NOQA
 
+from medi import settings  # noqa: E402
 from medi._compatibility import highest_pickle_protocol  # noqa: E402
 
+settings.cache_directory = sys.argv[3]
 
 # Retrieve the pickle protocol.
 host_sys_version = [int(x) for x in sys.argv[2].split('.')]
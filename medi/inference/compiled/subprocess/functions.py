@@ -15,6 +15,34 @@ def get_sys_path():
     return list(map(cast_path, sys.path))
 
 
+def warm_up():
+    # Importing the inference is by far the slowest part of handling the first
+    # request of an inference state.
+    import medi.inference  # noqa: F401
+    from medi import InterpreterEnvironment  # noqa: F401
+
+
+def get_stats(inference_states, process):
+    return {
+        'inference_states': len(inference_states),
+        'access_handles': len(process._handles) + sum(
+            len(i.compiled_subprocess._handles) for i in inference_states.values()
+        ),
+        'rss': _get_rss(),
+    }
+
+
+def _get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, AttributeError):
+        # Other platforms only provide the peak memory usage (``ru_maxrss``),
+        # which never drops and would therefore recycle the subprocess for
+        # every new inference state.
+        return None
+
+
 def load_module(inference_state, **kwargs):
     return access.load_module(inference_state, **kwargs)
 
@@ -86,6 +114,13 @@ def iter_module_names(*args, **kwargs):
     return list(_iter_module_names(*args, **kwargs))
 
 
+def get_module_names_by_path(inference_state, paths):
+    """
+    Like :func:`iter_module_names`, but returns a list of names per path.
+    """
+    return [list(_iter_module_names(inference_state, [path])) for path in paths]
+
+
 def _iter_module_names(inference_state, paths):
     # Python modules/packages
     for path in paths:
@@ -14,6 +14,7 @@ from medi.inference.names import AbstractNameDefinition, ValueNameMixin, \
 from medi.inference.base_value import Value, ValueSet, NO_VALUES
 from medi.inference.lazy_value import LazyKnownValue
 from medi.inference.compiled.access import _sentinel
+from medi.inference.compiled import member_cache
 from medi.inference.cache import inference_state_function_cache
 from medi.inference.helpers import reraise_getitem_errors
 from medi.inference.signature import BuiltinSignature
@@ -319,6 +320,9 @@ class CompiledModule(CompiledValue):
 
 
 class CompiledName(AbstractNameDefinition):
+    # The API type and the docstring from a member table, if available.
+    _member_info = None
+
     def __init__(self, inference_state, parent_value, name):
         self._inference_state = inference_state
         self.parent_context = parent_value.as_context()
@@ -326,6 +330,8 @@ class CompiledName(AbstractNameDefinition):
         self.string_name = name
 
     def py__doc__(self):
+        if self._member_info is not None:
+            return self._member_info[1]
         value, = self.infer()
         return value.py__doc__()
 
@@ -351,6 +357,8 @@ class CompiledName(AbstractNameDefinition):
 
     @property
     def api_type(self):
+        if self._member_info is not None:
+            return self._member_info[0]
         api = self.infer()
         # If we can't find the type, assume it is an instance variable
         if not api:
@@ -487,18 +495,34 @@ class CompiledValueFilter(AbstractFilter):
     def values(self):
         from medi.inference.compiled import builtin_from_name
         names = []
-        needs_type_completions, dir_infos = self.compiled_value.access_handle.get_dir_infos()
+        access_handle = self.compiled_value.access_handle
+        if self.is_instance:
+            # One call instead of one per attribute for the types of the
+            # completions. The result is cached by the access handle.
+            needs_type_completions, members = access_handle.get_member_table()
+        else:
+            needs_type_completions, members = member_cache.get_member_table(
+                self._inference_state, self.compiled_value)
+        dir_infos = dict((name, allowed) for name, allowed, member in members)
         # We could use `unsafe` here as well, especially as a parameter to
         # get_dir_infos. But this would lead to a lot of property executions
         # that are probably not wanted. The drawback for this is that we
         # have a different name for `get` and `values`. For `get` we always
         # execute.
-        for name in dir_infos:
-            names += self._get(
+        for name, allowed_getattr, member in members:
+            new_names = self._get(
                 name,
                 lambda name, unsafe: dir_infos[name],
                 lambda name: name in dir_infos,
             )
+            if member is not None:
+                paths, api_type, value_name, doc, safe_value = member
+                if paths is not None:
+                    _fill_member_caches(access_handle, name, member)
+                for n in new_names:
+                    if isinstance(n, CompiledName):
+                        n._member_info = api_type, doc
+            names += new_names
 
         # ``dir`` doesn't include the type names.
         if not self.is_instance and needs_type_completions:
@@ -517,6 +541,24 @@ class CompiledValueFilter(AbstractFilter):
         return "<%s: %s>" % (self.__class__.__name__, self.compiled_value)
 
 
+def _fill_member_caches(access_handle, name, member):
+    """
+    Caches the results of a member table entry (see
+    :meth:`.DirectObjectAccess.get_member_table`) as if the attribute had been
+    accessed, so inferring it (e.g. for the type of a completion) doesn't need
+    more calls.
+    """
+    paths, api_type, value_name, doc, safe_value = member
+    # Needs the same arguments as create_from_name.
+    access_handle._set_cached_result(u'getattr_paths', (name,), {'default': None}, paths)
+    access = paths[-1]
+    access._set_cached_result(u'get_api_type', (), {}, api_type)
+    access._set_cached_result(u'py__name__', (), {}, value_name)
+    access._set_cached_result(u'py__doc__', (), {}, doc)
+    if safe_value:
+        access._set_cached_result(u'get_safe_value', (), {}, safe_value[0])
+
+
 docstr_defaults = {
     'floating point number': u'float',
     'character': u'str',
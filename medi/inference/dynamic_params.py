@@ -20,7 +20,7 @@ It works as follows:
 from medi import settings
 from medi import debug
 from medi.parser_utils import get_parent_scope
-from medi.inference.cache import inference_state_method_cache
+from medi.inference.cache import inference_state_method_cache, add_module_dependency
 from medi.inference.arguments import TreeArguments
 from medi.inference.param import get_executed_param_names
 from medi.inference.helpers import is_stdlib_path
@@ -115,6 +115,8 @@ def _search_function_arguments(module_context, funcdef, string_name):
     found_arguments = False
     i = 0
     inference_state = module_context.inference_state
+    # The calls can be anywhere in the module.
+    add_module_dependency(module_context)
 
     if settings.dynamic_params_for_other_modules:
         module_contexts = get_module_contexts_containing_name(
@@ -17,6 +17,7 @@ from medi.inference.names import TreeNameDefinition, ParamName, \
     AnonymousParamName, AbstractNameDefinition
 
 _definition_name_cache = weakref.WeakKeyDictionary()
+_scope_definition_cache = weakref.WeakKeyDictionary()
 
 
 class AbstractFilter(object):
@@ -68,6 +69,60 @@ def _get_definition_names(used_names, name_key):
         return result
 
 
+def _get_definition_table(used_names):
+    """
+    Groups the definitions of a module by the scopes they are defined in. The
+    table is built at once and cached until the module changes. It's built
+    again after every change, marso creates new used names then anyway and
+    that takes about as long.
+
+    :returns: A tuple ``(by_scope, attributes_by_class)`` of dicts of
+        ``Dict[str, List[Name]]``. ``attributes_by_class`` contains the
+        attribute definitions like ``self.foo = 1`` of every class they are
+        in.
+    """
+    try:
+        return _scope_definition_cache[used_names]
+    except KeyError:
+        pass
+
+    by_scope = {}
+    attributes_by_class = {}
+    for name_key in used_names:
+        for name in _get_definition_names(used_names, name_key):
+            parent = name.parent
+            if parent.type == 'trailer':
+                node = parent
+                while node is not None:
+                    if node.type == 'classdef':
+                        attributes_by_class.setdefault(node, {}) \
+                            .setdefault(name_key, []).append(name)
+                    node = node.parent
+                continue
+            base_node = parent if parent.type in ('classdef', 'funcdef') else name
+            name_scope = get_cached_parent_scope(used_names, base_node)
+            by_scope.setdefault(name_scope, {}).setdefault(name_key, []).append(name)
+    table = _scope_definition_cache[used_names] = by_scope, attributes_by_class
+    return table
+
+
+def _get_scope_definition_names(used_names, scope):
+    """
+    Returns the definitions of a scope as ``Dict[str, List[Name]]``, so
+    listing the names of a scope doesn't iterate over all the names of the
+    module.
+    """
+    return _get_definition_table(used_names)[0].get(scope, {})
+
+
+def get_attribute_definition_names(used_names, class_node):
+    """
+    Like :func:`_get_scope_definition_names`, but returns the attribute
+    definitions (e.g. ``self.foo = 1``) within a class.
+    """
+    return _get_definition_table(used_names)[1].get(class_node, {})
+
+
 class AbstractUsedNamesFilter(AbstractFilter):
     name_class = TreeNameDefinition
 
@@ -119,6 +174,15 @@ class ParserTreeFilter(AbstractUsedNamesFilter):
         names = [n for n in names if self._is_name_reachable(n)]
         return list(self._check_flows(names))
 
+    def values(self):
+        # Only the definitions of this scope can be reachable.
+        names_by_key = _get_scope_definition_names(self._used_names, self._parser_scope)
+        return self._convert_names(
+            name
+            for names in names_by_key.values()
+            for name in self._filter(names)
+        )
+
     def _is_name_reachable(self, name):
         parent = name.parent
         if parent.type == 'trailer':
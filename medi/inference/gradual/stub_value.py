@@ -1,10 +1,14 @@
+import weakref
+
 from medi.inference.base_value import ValueWrapper
 from medi.inference.value.module import ModuleValue
-from medi.inference.filters import ParserTreeFilter
+from medi.inference.filters import ParserTreeFilter, DictFilter
 from medi.inference.names import StubName, StubModuleName
 from medi.inference.gradual.typing import TypingModuleFilterWrapper
 from medi.inference.context import ModuleContext
 
+_reachable_name_cache = weakref.WeakKeyDictionary()
+
 
 class StubModuleValue(ModuleValue):
     _module_name_class = StubModuleName
@@ -34,20 +38,22 @@ class StubModuleValue(ModuleValue):
         return names
 
     def _get_stub_filters(self, origin_scope):
-        return [StubFilter(
+        yield StubFilter(
             parent_context=self.as_context(),
             origin_scope=origin_scope
-        )] + list(self.iter_star_filters())
-
-    def get_filters(self, origin_scope=None):
-        filters = super(StubModuleValue, self).get_filters(origin_scope)
-        next(filters, None)  # Ignore the first filter and replace it with our own
-        stub_filters = self._get_stub_filters(origin_scope=origin_scope)
-        for f in stub_filters:
+        )
+        # Star imports are only followed if a name is not defined in the stub
+        # itself.
+        for f in self.iter_star_filters():
             yield f
 
-        for f in filters:
+    def get_filters(self, origin_scope=None):
+        # Filters are created on demand, name lookups usually stop at the
+        # first one.
+        for f in self._get_stub_filters(origin_scope=origin_scope):
             yield f
+        yield DictFilter(self.sub_modules_dict())
+        yield DictFilter(self._module_attributes_dict())
 
     def _as_context(self):
         return StubModuleContext(self)
@@ -85,6 +91,19 @@ class StubFilter(ParserTreeFilter):
     name_class = StubName
 
     def _is_name_reachable(self, name):
+        # Stubs like builtins.pyi are huge and asked for the same names over
+        # and over again, so the result is cached per name.
+        try:
+            for_module = _reachable_name_cache[self._used_names]
+        except KeyError:
+            for_module = _reachable_name_cache[self._used_names] = {}
+        try:
+            return for_module[name]
+        except KeyError:
+            result = for_module[name] = self._check_name_reachable(name)
+            return result
+
+    def _check_name_reachable(self, name):
         if not super(StubFilter, self)._is_name_reachable(name):
             return False
 
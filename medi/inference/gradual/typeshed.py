@@ -1,10 +1,13 @@
 import os
 import re
+import hashlib
 from functools import wraps
 
 from medi import settings
 from medi.file_io import FileIO
-from medi._compatibility import FileNotFoundError, cast_path
+from medi._compatibility import FileNotFoundError, cast_path, pickle, \
+    pickle_load
+from medi.cache import get_version_tag, dump_atomically
 from medi.parser_utils import get_cached_code_lines
 from medi.inference.base_value import ValueSet, NO_VALUES
 from medi.inference.gradual.stub_value import TypingModuleWrapper, StubModuleValue
@@ -20,6 +23,127 @@ _IMPORT_MAP = dict(
     _socket='socket',
 )
 
+_STUB_INDEX_VERSION = 3
+
+_stub_index = None
+
+
+def _get_stub_index_key(typeshed_path):
+    """
+    Typeshed only changes with Medi, but a checkout might update it in place,
+    which changes the modification times of its directories.
+    """
+    from medi import __version__
+    mtimes = []
+    for directory in ['', 'stdlib', 'third_party']:
+        try:
+            mtimes.append(os.stat(os.path.join(typeshed_path, directory)).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return __version__, tuple(mtimes)
+
+
+def _get_stub_index_path(typeshed_path):
+    file_hash = hashlib.sha256(typeshed_path.encode('utf-8')).hexdigest()
+    return os.path.join(
+        settings.cache_directory,
+        'typeshed',
+        get_version_tag(_STUB_INDEX_VERSION),
+        file_hash + '.pkl'
+    )
+
+
+def build_stub_index(typeshed_path=TYPESHED_PATH):
+    """
+    Returns an index of the stubs in ``typeshed_path``, so Medi doesn't need
+    to walk typeshed's directories in every process. Paths in the index are
+    relative to ``typeshed_path``.
+
+    The top-level names of the stubs are not part of it, because collecting
+    them means parsing all stubs. They are added to ``names`` by
+    :func:`_get_stub_names` once a stub is searched.
+    """
+    stub_maps = {}
+    for root, dirs, files in os.walk(typeshed_path):
+        stub_map = _create_stub_map(root, use_index=False)
+        if not stub_map:
+            continue
+        relative_root = os.path.relpath(root, typeshed_path)
+        stub_maps[relative_root] = dict(
+            (name, os.path.relpath(path, typeshed_path))
+            for name, path in stub_map.items()
+        )
+
+    listings = {}
+    for base in ['stdlib', 'third_party']:
+        try:
+            listings[base] = os.listdir(os.path.join(typeshed_path, base))
+        except OSError:
+            listings[base] = []
+    return dict(stub_maps=stub_maps, names={}, listings=listings)
+
+
+def _build_stub_names(typeshed_path, path):
+    from medi.inference.grammar_cache import load_grammar
+    from medi.inference.symbol_index import get_indexed_names
+
+    with open(os.path.join(typeshed_path, path), 'rb') as f:
+        module_node = load_grammar().parse(f.read().decode('utf-8', 'replace'))
+    return tuple(sorted(set(
+        n.string_name for n in get_indexed_names(module_node) if n.is_module_scope
+    )))
+
+
+def _load_stub_index(typeshed_path):
+    try:
+        with open(_get_stub_index_path(typeshed_path), 'rb') as f:
+            version, key, index = pickle_load(f)
+    except (IOError, OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+    if version != _STUB_INDEX_VERSION or key != _get_stub_index_key(typeshed_path):
+        return None
+    return index
+
+
+def _save_stub_index(typeshed_path, index):
+    data = _STUB_INDEX_VERSION, _get_stub_index_key(typeshed_path), index
+    dump_atomically(_get_stub_index_path(typeshed_path), data)
+
+
+def _get_stub_index():
+    """
+    Returns the index of :func:`build_stub_index` or None if there is no
+    typeshed. It's built on first use and stored in
+    :attr:`medi.settings.cache_directory`.
+    """
+    global _stub_index
+    if _stub_index is None:
+        index = _load_stub_index(TYPESHED_PATH)
+        if index is None and os.path.isdir(TYPESHED_PATH):
+            index = build_stub_index(TYPESHED_PATH)
+            _save_stub_index(TYPESHED_PATH, index)
+        _stub_index = index or {}
+    return _stub_index or None
+
+
+def _get_stub_names(index, path):
+    """
+    Returns the top-level names of the stub with the relative ``path``. The
+    stub is only parsed if ``index`` doesn't know its names yet.
+    """
+    try:
+        return index['names'][path]
+    except KeyError:
+        names = index['names'][path] = _build_stub_names(TYPESHED_PATH, path)
+        return names
+
+
+def _get_relative_typeshed_path(path):
+    relative = os.path.relpath(path, TYPESHED_PATH)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return None
+    return relative
+
 
 def _merge_create_stub_map(directories):
     map_ = {}
@@ -28,10 +152,19 @@ def _merge_create_stub_map(directories):
     return map_
 
 
-def _create_stub_map(directory):
+def _create_stub_map(directory, use_index=True):
     """
     Create a mapping of an importable name in Python to a stub file.
     """
+    index = _get_stub_index() if use_index else None
+    if index is not None:
+        relative = _get_relative_typeshed_path(directory)
+        if relative is not None:
+            return dict(
+                (name, os.path.join(TYPESHED_PATH, path))
+                for name, path in index['stub_maps'].get(relative, {}).items()
+            )
+
     def generate():
         try:
             listed = os.listdir(directory)
@@ -57,9 +190,16 @@ def _create_stub_map(directory):
 
 def _get_typeshed_directories(version_info):
     check_version_list = ['2and3', str(version_info.major)]
+    index = _get_stub_index()
     for base in ['stdlib', 'third_party']:
+        if index is not None:
+            base_list = index['listings'][base]
+        else:
+            try:
+                base_list = os.listdir(os.path.join(TYPESHED_PATH, base))
+            except OSError:
+                base_list = []
         base = os.path.join(TYPESHED_PATH, base)
-        base_list = os.listdir(base)
         for base_list_entry in base_list:
             match = re.match(r'(\d+)\.(\d+)$', base_list_entry)
             if match is not None:
@@ -91,6 +231,55 @@ def _cache_stub_file_map(version_info):
     return file_set
 
 
+def find_stub_modules(version_info, string_name, complete=False):
+    """
+    Uses the index of typeshed to find the modules that define
+    ``string_name`` on the top level. Names are compared case insensitively.
+
+    The stubs are only parsed if they are searched for the first time (the
+    names are then stored in the index), so this is a generator. Stubs whose
+    module name matches are searched first.
+
+    :param complete: If True, ``string_name`` only needs to be a prefix.
+    :returns: A generator of ``(dotted module name, path of the stub)``
+        tuples.
+    """
+    index = _get_stub_index()
+    if index is None:
+        return
+
+    def iterate_modules(directory, prefix):
+        relative = _get_relative_typeshed_path(directory)
+        for name, path in index['stub_maps'].get(relative, {}).items():
+            yield prefix + name, path
+            if os.path.basename(path) == '__init__.pyi':
+                for module in iterate_modules(
+                        os.path.join(TYPESHED_PATH, os.path.dirname(path)),
+                        prefix + name + '.'):
+                    yield module
+
+    string_name = string_name.lower()
+
+    def matches(name):
+        lowered = name.lower()
+        return lowered == string_name or complete and lowered.startswith(string_name)
+
+    modules = [
+        module
+        for directory in _get_typeshed_directories(version_info)
+        for module in iterate_modules(directory, '')
+    ]
+    modules.sort(key=lambda module: not matches(module[0].rpartition('.')[2]))
+    known = len(index['names'])
+    try:
+        for module_name, path in modules:
+            if any(matches(name) for name in _get_stub_names(index, path)):
+                yield module_name, os.path.join(TYPESHED_PATH, path)
+    finally:
+        if len(index['names']) != known:
+            _save_stub_index(TYPESHED_PATH, index)
+
+
 def import_module_decorator(func):
     @wraps(func)
     def wrapper(inference_state, import_names, parent_module_value, sys_path, prefer_stubs):
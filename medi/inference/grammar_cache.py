@@ -0,0 +1,98 @@
+"""
+A process-wide registry of marso grammars.
+
+Generating the parser tables of a grammar from its BNF description takes about
+40 ms per grammar and used to happen in every process, for the grammar of the
+running Python, the grammar of the environment and the latest grammar (for
+stubs). Grammars are therefore kept in memory by language and version and
+pickled to :attr:`medi.settings.cache_directory`. Entries are keyed by the
+version and the location of marso, so upgrading marso generates them again.
+"""
+import os
+import sys
+import hashlib
+
+import marso
+from marso.python.token import TokenType, PythonTokenTypes
+
+from medi import debug
+from medi import settings
+from medi._compatibility import pickle
+from medi.cache import get_version_tag, dump_atomically
+
+_CACHE_VERSION = 1
+
+_VERSION_TAG = get_version_tag(marso.__version__, _CACHE_VERSION)
+
+# Dict[Tuple[str, str], marso.Grammar]
+_grammars = {}
+
+
+def _get_cache_path(language, version):
+    # Different installations of the same marso version might have different
+    # grammar files.
+    h = hashlib.sha256(os.path.dirname(marso.__file__).encode('utf-8'))
+    h.update(('%s-%s' % (language, version)).encode('utf-8'))
+    return os.path.join(
+        settings.cache_directory,
+        'grammars',
+        _VERSION_TAG,
+        h.hexdigest() + '.pkl'
+    )
+
+
+def _persistent_id(obj):
+    # The parser compares token types by identity, so they must not be copied.
+    if isinstance(obj, TokenType):
+        return obj.name
+    return None
+
+
+def _persistent_load(name):
+    return getattr(PythonTokenTypes, name)
+
+
+def _load_from_file_system(path):
+    try:
+        with open(path, 'rb') as f:
+            unpickler = pickle.Unpickler(f)
+            unpickler.persistent_load = _persistent_load
+            return unpickler.load()
+    except (IOError, OSError):
+        return None
+    except Exception:
+        # A broken entry, probably written by an incompatible version.
+        debug.warning('Ignoring broken grammar cache entry %s', path)
+        return None
+
+
+def _dump(grammar, file):
+    pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id
+    pickler.dump(grammar)
+
+
+def load_grammar(language='python', version=None):
+    """
+    Like :func:`marso.load_grammar`, but grammars are only generated once and
+    then loaded from the cache.
+
+    :param str version: A Python version string like ``'3.8'``. Defaults to
+        the version of the running Python for Python grammars.
+    """
+    if version is None:
+        version = '%s.%s' % sys.version_info[:2] if language == 'python' else ''
+    key = language, version
+    try:
+        return _grammars[key]
+    except KeyError:
+        pass
+
+    path = _get_cache_path(language, version)
+    grammar = _load_from_file_system(path)
+    if grammar is None:
+        grammar = marso.load_grammar(language=language, version=version)
+        dump_atomically(path, grammar, dump=_dump)
+    else:
+        debug.dbg('Loaded the %s %s grammar from the cache', language, version)
+    return _grammars.setdefault(key, grammar)
@@ -37,14 +37,38 @@ from medi.plugins import plugin_manager
 class ModuleCache(object):
     def __init__(self):
         self._name_cache = {}
+        self._last_modified = {}
+        # Only needed to find changed files, see `InferenceSession`.
+        self.track_modifications = False
 
     def add(self, string_names, value_set):
         if string_names is not None:
             self._name_cache[string_names] = value_set
+            if not self.track_modifications:
+                return
+            for module in value_set:
+                file_io = getattr(module, 'file_io', None)
+                if file_io is not None:
+                    self._last_modified[module] = file_io.get_last_modified()
 
     def get(self, string_names):
         return self._name_cache.get(string_names)
 
+    def iterate_changed_modules(self):
+        """
+        Yields the modules whose files have been modified since they were
+        added to the cache. Only works if ``track_modifications`` is set.
+        """
+        for module, last_modified in list(self._last_modified.items()):
+            if module.file_io.get_last_modified() != last_modified:
+                yield module
+
+    def remove_module(self, module):
+        self._last_modified.pop(module, None)
+        for string_names, value_set in list(self._name_cache.items()):
+            if module in value_set:
+                del self._name_cache[string_names]
+
 
 # This memoization is needed, because otherwise we will infinitely loop on
 # certain imports.
@@ -548,6 +572,67 @@ def follow_error_node_imports_if_possible(context, name):
     return None
 
 
+# Dict[str, List[str]]
+_builtin_module_names = {}
+# Dict[str, Dict[str, Tuple[Optional[float], Dict[str, Optional[float]], List[str]]]]
+_module_names = {}
+
+
+def _get_builtin_module_names(inference_state):
+    executable = inference_state.environment.executable
+    try:
+        return _builtin_module_names[executable]
+    except KeyError:
+        names = inference_state.compiled_subprocess.get_builtin_module_names()
+        return _builtin_module_names.setdefault(executable, names)
+
+
+def _get_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _get_module_names(inference_state, search_path):
+    """
+    The module names of the directories in ``search_path`` are cached per
+    environment (the suffixes of extension modules depend on it). A directory
+    is only listed again if its modification time or the one of its
+    subdirectories changes, which happens if files are added, removed or
+    renamed in them (e.g. an ``__init__.py`` that turns a folder into a
+    package). All changed directories are listed with one call to the
+    subprocess.
+    """
+    cache = _module_names.setdefault(inference_state.environment.executable, {})
+    mtimes = {}
+    changed = []
+    for path in search_path:
+        if path in mtimes:
+            continue
+        mtimes[path] = mtime = _get_mtime(path)
+        entry = cache.get(path)
+        if entry is None or entry[0] != mtime or any(
+                _get_mtime(os.path.join(path, name)) != subdirectory_mtime
+                for name, subdirectory_mtime in entry[1].items()):
+            changed.append(path)
+
+    if changed:
+        debug.dbg('Listing the modules of %s', changed)
+        listed = inference_state.compiled_subprocess.get_module_names_by_path(changed)
+        for path, names in zip(changed, listed):
+            subdirectory_mtimes = {}
+            for name in names:
+                subdirectory = os.path.join(path, name)
+                if os.path.isdir(subdirectory):
+                    subdirectory_mtimes[name] = _get_mtime(subdirectory)
+            cache[path] = mtimes[path], subdirectory_mtimes, names
+
+    for path in search_path:
+        for name in cache[path][2]:
+            yield name
+
+
 def iter_module_names(inference_state, module_context, search_path,
                       module_cls=ImportName, add_builtin_modules=True):
     """
@@ -556,8 +641,8 @@ def iter_module_names(inference_state, module_context, search_path,
     """
     # add builtin module names
     if add_builtin_modules:
-        for name in inference_state.compiled_subprocess.get_builtin_module_names():
+        for name in _get_builtin_module_names(inference_state):
             yield module_cls(module_context, name)
 
-    for name in inference_state.compiled_subprocess.iter_module_names(search_path):
+    for name in _get_module_names(inference_state, search_path):
         yield module_cls(module_context, name)
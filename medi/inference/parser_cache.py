@@ -1,5 +1,172 @@
+"""
+Caches of parser trees.
+
+Modules that are not edited by the user (libraries, stubs, the targets of
+reference searches) are pickled to :attr:`medi.settings.cache_directory`. In
+contrast to marso's own disk cache, entries are keyed by a hash of the grammar
+and the content of a file instead of its path and modification time. This
+means that identical files (e.g. the same library in different virtualenvs)
+share an entry and that many processes can safely use the same directory,
+because entries are written atomically and never change once written.
+
+The size of the cache is bounded by :attr:`medi.settings.parse_tree_cache_size`.
+Entries that have not been used for the longest time are removed first.
+"""
+import os
+import gc
+import time
+import hashlib
+
+import marso
+from marso import split_lines
+from marso.cache import parser_cache, save_module
+
+from medi import debug
+from medi import settings
+from medi._compatibility import pickle
+from medi.cache import get_version_tag, dump_atomically
 from medi.inference.cache import inference_state_function_cache
 
+_CACHE_VERSION = 1
+
+_VERSION_TAG = get_version_tag(marso.__version__, _CACHE_VERSION)
+
+_EVICTION_INTERVAL = 100
+"""
+The size of the cache directory is checked after this many entries have been
+written by a process (and after the first one).
+"""
+
+_saved_count = 0
+
+
+def _get_cache_directory(cache_path=None):
+    if cache_path is None:
+        cache_path = settings.cache_directory
+    return os.path.join(cache_path, 'parse_trees', _VERSION_TAG)
+
+
+def _get_content_hash(grammar, code):
+    h = hashlib.sha256(grammar._hashed.encode('utf-8'))
+    h.update(code.encode('utf-8', 'replace'))
+    return h.hexdigest()
+
+
+def _load_from_file_system(path):
+    try:
+        with open(path, 'rb') as f:
+            gc.disable()
+            try:
+                module_node = pickle.load(f)
+            finally:
+                gc.enable()
+    except (IOError, OSError):
+        return None
+    except Exception:
+        # A broken entry, probably written by an incompatible version.
+        debug.warning('Removing broken parse tree cache entry %s', path)
+        _remove(path)
+        return None
+
+    try:
+        # Mark the entry as recently used for the LRU eviction.
+        os.utime(path, None)
+    except OSError:
+        pass
+    return module_node
+
+
+def _save_to_file_system(directory, path, module_node):
+    global _saved_count
+    if not dump_atomically(path, module_node):
+        return
+
+    if _saved_count % _EVICTION_INTERVAL == 0:
+        evict(directory)
+    _saved_count += 1
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(directory=None, size_limit=None):
+    """
+    Removes the least recently used entries of the parse tree cache until its
+    size is below ``size_limit`` (default
+    :attr:`medi.settings.parse_tree_cache_size`).
+    """
+    if directory is None:
+        directory = _get_cache_directory()
+    if size_limit is None:
+        size_limit = settings.parse_tree_cache_size
+
+    entries = []
+    total_size = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Probably removed by another process.
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total_size += stat.st_size
+
+    if total_size <= size_limit:
+        return
+
+    debug.dbg('Evicting parse trees, the cache has %s bytes', total_size)
+    for mtime, size, path in sorted(entries):
+        _remove(path)
+        total_size -= size
+        if total_size <= size_limit:
+            break
+
+
+def parse(grammar, code, file_io, diff_cache=False, cache_path=None):
+    """
+    Parses ``code`` of a file that is not edited by the user and caches the
+    result in memory and on disk.
+
+    The in-memory cache is marso's ``parser_cache``, which is also used to
+    access the code lines of a module later on.
+    """
+    path = file_io.path
+    lines = split_lines(code, keepends=True)
+    try:
+        item = parser_cache[grammar._hashed][path]
+    except KeyError:
+        pass
+    else:
+        if item.lines == lines:
+            item.last_used = time.time()
+            return item.node
+
+    directory = _get_cache_directory(cache_path)
+    cache_file = os.path.join(directory, _get_content_hash(grammar, code) + '.pkl')
+    module_node = _load_from_file_system(cache_file)
+    if module_node is None:
+        module_node = grammar.parse(
+            code=code,
+            path=path,
+            file_io=file_io,
+            diff_cache=diff_cache,
+        )
+        _save_to_file_system(directory, cache_file, module_node)
+    else:
+        debug.dbg('Loaded parse tree of %s from the cache', path)
+
+    save_module(grammar._hashed, file_io, module_node, lines, pickling=False)
+    return module_node
+
 
 @inference_state_function_cache()
 def get_yield_exprs(inference_state, funcdef):
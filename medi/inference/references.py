@@ -1,14 +1,21 @@
 import os
-import re
+import atexit
+import multiprocessing
+from itertools import islice
 
 from marso import python_bytes_to_unicode
 
+from medi import settings
 from medi._compatibility import FileNotFoundError
 from medi.debug import dbg
 from medi.file_io import KnownContentFileIO
 from medi.inference.imports import SubModuleName, load_module_from_path
+from medi.inference import parser_cache
+from medi.inference.grammar_cache import load_grammar
 from medi.inference.filters import ParserTreeFilter
 from medi.inference.gradual.conversion import convert_names
+from medi.inference.symbol_index import get_identifier_index, \
+    save_identifier_indexes, get_identifiers, get_stat_key
 
 _IGNORE_FOLDERS = ('.tox', '.venv', 'venv', '__pycache__')
 
@@ -18,12 +25,25 @@ Stats from a 2016 Lenovo Notebook running Linux:
 With os.walk, it takes about 10s to scan 11'000 files (without filesystem
 caching). Once cached it only takes 5s. So it is expected that reading all
 those files might take a few seconds, but not a lot more.
+
+Only files that are not part of an identifier index yet (or changed since they
+were indexed) have to be opened, see :class:`.IdentifierIndex`. Files that are
+looked up in the index don't count towards this limit.
 """
 _PARSED_FILE_LIMIT = 30
 """
 For now we keep the amount of parsed files really low, since parsing might take
 easily 100ms for bigger files.
 """
+_PREFETCH_CHUNK_SIZE = 64
+"""
+The maximum amount of files that are handed to the worker processes at once,
+see :attr:`medi.settings.reference_search_processes`. Chunks are smaller if
+the search is about to hit its limits, so no files are read in vain.
+"""
+
+_process_pool = None
+_process_pool_size = None
 
 
 def _resolve_names(definition_names, avoid_names=()):
@@ -143,6 +163,7 @@ def find_references(module_context, tree_name):
 
     non_matching_reference_maps = {}
     for module_context in potential_modules:
+        inf.check_cancelled()
         for name_leaf in module_context.tree_node.get_used_names().get(search_name, []):
             new = _dictionarize(_find_names(module_context, name_leaf))
             if any(tree_name in found_names_dct for tree_name in new):
@@ -162,19 +183,31 @@ def find_references(module_context, tree_name):
     return found_names_dct.values()
 
 
-def _check_fs(inference_state, file_io, regex):
+def _check_fs(inference_state, file_io, name):
+    """
+    Returns a tuple ``(module_context, opened)``. The module context is None
+    if the file does not use ``name``.
+    """
+    index = get_identifier_index(os.path.dirname(file_io.path))
+    try:
+        contains, code = index.check_file(inference_state, file_io, name)
+    except (FileNotFoundError, IOError):
+        return None, False
+
+    opened = code is not None
+    if not contains:
+        return None, opened
+    if code is None:
+        new_file_io = file_io
+    else:
+        new_file_io = KnownContentFileIO(file_io.path, code)
     try:
-        code = file_io.read()
+        m = load_module_from_path(inference_state, new_file_io)
     except FileNotFoundError:
-        return None
-    code = python_bytes_to_unicode(code, errors='replace')
-    if not regex.search(code):
-        return None
-    new_file_io = KnownContentFileIO(file_io.path, code)
-    m = load_module_from_path(inference_state, new_file_io)
+        return None, opened
     if m.is_compiled():
-        return None
-    return m.as_context()
+        return None, opened
+    return m.as_context(), opened
 
 
 def gitignored_lines(folder_io, file_io):
@@ -272,22 +305,125 @@ def get_module_contexts_containing_name(inference_state, module_contexts, name,
         yield x  # Python 2...
 
 
+def _get_process_pool(processes):
+    global _process_pool, _process_pool_size
+    if _process_pool is None or _process_pool_size != processes:
+        _terminate_process_pool()
+        try:
+            get_context = multiprocessing.get_context
+        except AttributeError:
+            # Python 2
+            pool_class = multiprocessing.Pool
+        else:
+            # Medi uses threads (e.g. for the environment subprocesses), so
+            # forking could copy locks that are held by other threads.
+            pool_class = get_context('spawn').Pool
+        _process_pool = pool_class(processes)
+        _process_pool_size = processes
+    return _process_pool
+
+
+@atexit.register
+def _terminate_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.terminate()
+        _process_pool.join()
+        _process_pool = None
+
+
+def _prefetch_file(args):
+    """
+    Runs in a worker process. Tokenizes a file and, if it uses the name,
+    parses it as well, so the main process can load the tree from the parse
+    tree cache instead of parsing it again.
+    """
+    path, string_name, version, cache_path = args
+    # Workers are spawned, so they don't know the settings of the main
+    # process. The grammar and parse tree caches need the same directory.
+    settings.cache_directory = cache_path
+    key = get_stat_key(path)
+    if key is None:
+        return path, None, None
+    try:
+        with open(path, 'rb') as f:
+            code = python_bytes_to_unicode(f.read(), errors='replace')
+    except (FileNotFoundError, IOError):
+        return path, None, None
+
+    grammar = load_grammar(version=version)
+    identifiers = get_identifiers(code, grammar.version_info)
+    if string_name in identifiers:
+        parser_cache.parse(grammar, code, KnownContentFileIO(path, code))
+    return path, key, identifiers
+
+
+def _iter_prefetched_file_ios(inference_state, file_io_iterator, name, processes,
+                              get_chunk_size):
+    """
+    Reads, tokenizes and parses files that are not indexed yet in worker
+    processes. The results are merged into the identifier indexes in the
+    order of the files, so the search stays deterministic.
+
+    :param get_chunk_size: Returns the amount of files that can still be
+        searched before hitting a limit.
+
+    Yields tuples of ``(file_io, opened)``.
+    """
+    pool = _get_process_pool(processes)
+    version = '%s.%s' % tuple(inference_state.grammar.version_info[:2])
+    while True:
+        chunk_size = min(_PREFETCH_CHUNK_SIZE, get_chunk_size())
+        chunk = list(islice(file_io_iterator, max(int(chunk_size), 1)))
+        if not chunk:
+            return
+
+        outdated = [
+            file_io.path for file_io in chunk
+            if not get_identifier_index(os.path.dirname(file_io.path))
+            .is_up_to_date(file_io.path)
+        ]
+        args = [(path, name, version, settings.cache_directory) for path in outdated]
+        for path, key, identifiers in pool.imap(_prefetch_file, args):
+            if key is not None:
+                get_identifier_index(os.path.dirname(path)).add_file(path, key, identifiers)
+
+        outdated = set(outdated)
+        for file_io in chunk:
+            yield file_io, file_io.path in outdated
+
+
 def search_in_file_ios(inference_state, file_io_iterator, name, limit_reduction=1):
     parse_limit = _PARSED_FILE_LIMIT / limit_reduction
     open_limit = _OPENED_FILE_LIMIT / limit_reduction
     file_io_count = 0
     parsed_file_count = 0
-    regex = re.compile(r'\b' + re.escape(name) + r'\b')
-    for file_io in file_io_iterator:
-        file_io_count += 1
-        m = _check_fs(inference_state, file_io, regex)
-        if m is not None:
-            parsed_file_count += 1
-            yield m
-            if parsed_file_count >= parse_limit:
-                dbg('Hit limit of parsed files: %s', parse_limit)
-                break
 
-        if file_io_count >= open_limit:
-            dbg('Hit limit of opened files: %s', open_limit)
-            break
+    processes = settings.reference_search_processes
+    if processes:
+        # Every file of a chunk might have to be parsed.
+        file_ios = _iter_prefetched_file_ios(
+            inference_state, iter(file_io_iterator), name, processes,
+            lambda: min(open_limit - file_io_count, parse_limit - parsed_file_count),
+        )
+    else:
+        file_ios = ((file_io, False) for file_io in file_io_iterator)
+
+    try:
+        for file_io, prefetched in file_ios:
+            inference_state.check_cancelled()
+            m, opened = _check_fs(inference_state, file_io, name)
+            if opened or prefetched:
+                file_io_count += 1
+            if m is not None:
+                parsed_file_count += 1
+                yield m
+                if parsed_file_count >= parse_limit:
+                    dbg('Hit limit of parsed files: %s', parse_limit)
+                    break
+
+            if file_io_count >= open_limit:
+                dbg('Hit limit of opened files: %s', open_limit)
+                break
+    finally:
+        save_identifier_indexes()
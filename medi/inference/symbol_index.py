@@ -0,0 +1,365 @@
+"""
+Persistent indexes of the Python files of a project.
+
+Searching a project used to mean reading every file, scanning it with a regex
+and parsing the files that matched. The indexes in this module are stored in
+:attr:`medi.settings.cache_directory` together with the modification time and
+the size of each file, so only files that changed since the last search have to
+be read again:
+
+- :class:`SymbolIndex` stores the definitions of all files in a project and is
+  used by :meth:`.Project.search`.
+- :class:`IdentifierIndex` maps identifiers to the files of a folder that use
+  them. It is used to find references.
+"""
+import os
+import hashlib
+from collections import namedtuple
+from itertools import chain
+
+from marso import python_bytes_to_unicode
+from marso.python.token import PythonTokenTypes
+from marso.python.tokenizer import tokenize
+
+from medi import debug
+from medi import settings
+from medi._compatibility import FileNotFoundError, pickle, pickle_load
+from medi.cache import get_version_tag, dump_atomically
+from medi.inference.names import TreeNameDefinition
+from medi.parser_utils import get_parent_scope
+
+_INDEX_VERSION = 2
+
+_VERSION_TAG = get_version_tag(_INDEX_VERSION)
+
+IndexedName = namedtuple(
+    'IndexedName',
+    ['string_name', 'type', 'qualified_name', 'start_pos', 'is_module_scope']
+)
+"""
+A definition in a file. ``qualified_name`` is the dotted path of the
+definition within its module, e.g. ``Foo.bar`` for a method ``bar`` of a class
+``Foo``.
+"""
+
+_indexes = {}
+_identifier_indexes = {}
+
+
+def get_project_index(project_path):
+    """
+    Returns the :class:`SymbolIndex` of a project. Indexes are kept in memory
+    once they have been created.
+    """
+    try:
+        return _indexes[project_path]
+    except KeyError:
+        index = _indexes[project_path] = SymbolIndex(project_path)
+        return index
+
+
+def get_identifier_index(folder_path):
+    """
+    Returns the :class:`IdentifierIndex` of a folder. Like project indexes,
+    they are kept in memory once they have been loaded from disk.
+    """
+    try:
+        return _identifier_indexes[folder_path]
+    except KeyError:
+        index = IdentifierIndex.load(folder_path)
+        _identifier_indexes[folder_path] = index
+        return index
+
+
+def save_identifier_indexes():
+    """
+    Writes all identifier indexes that changed since they were loaded to
+    disk.
+    """
+    for index in _identifier_indexes.values():
+        if index.changed:
+            index.save()
+
+
+def _get_index_path(kind, path):
+    file_hash = hashlib.sha256(path.encode('utf-8')).hexdigest()
+    return os.path.join(
+        settings.cache_directory,
+        kind,
+        _VERSION_TAG,
+        '%s.pkl' % file_hash
+    )
+
+
+def _load_index_file(path):
+    try:
+        with open(path, 'rb') as f:
+            version, data = pickle_load(f)
+    except (FileNotFoundError, IOError, EOFError, ValueError,
+            pickle.UnpicklingError):
+        return None
+    if version != _INDEX_VERSION:
+        return None
+    return data
+
+
+def _save_index_file(path, data):
+    dump_atomically(path, (_INDEX_VERSION, data))
+
+
+def get_stat_key(path):
+    """
+    Returns the key that decides if an index entry is still valid or None if
+    the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def _get_qualified_name(name, scope):
+    parts = [name.value]
+    while scope is not None and scope.type != 'file_input':
+        if scope.type in ('classdef', 'funcdef'):
+            parts.append(scope.name.value)
+        scope = get_parent_scope(scope)
+    return '.'.join(reversed(parts))
+
+
+def get_indexed_names(module_node):
+    """
+    Returns :class:`IndexedName` objects for all the definitions of a module,
+    sorted by position.
+    """
+    result = []
+    for name in chain.from_iterable(module_node.get_used_names().values()):
+        if not name.is_definition():
+            continue
+
+        definition = name.get_definition(import_name_always=True)
+        if definition is None:
+            type_ = 'statement'
+        else:
+            type_ = TreeNameDefinition._API_TYPES.get(definition.type, 'statement')
+
+        scope = get_parent_scope(name)
+        # async functions have an extra wrapper. Strip it.
+        if scope is not None and scope.type == 'async_stmt':
+            scope = scope.parent
+        result.append(IndexedName(
+            name.value,
+            type_,
+            _get_qualified_name(name, scope),
+            name.start_pos,
+            scope in (module_node, None),
+        ))
+    return sorted(result, key=lambda n: n.start_pos)
+
+
+class SymbolIndex(object):
+    """
+    Maps the paths of the Python files in a project to their definitions. An
+    entry is only valid as long as the modification time and the size of the
+    file do not change.
+
+    Entries are stored per folder and loaded once a file of the folder is
+    indexed, so a changed file only means that its folder is written again.
+    """
+    def __init__(self, project_path):
+        self.project_path = project_path
+        # Dict[str, Dict[str, Tuple[Tuple[float, int], List[IndexedName]]]]
+        self._folders = {}
+        self._entries = {}
+        self._paths = []
+
+    def _get_folder_entries(self, folder_path):
+        try:
+            return self._folders[folder_path]
+        except KeyError:
+            entries = _load_index_file(_get_index_path('symbol_index', folder_path))
+            if entries is None:
+                entries = {}
+            else:
+                debug.dbg('Loaded symbol index for %s', folder_path)
+            return self._folders.setdefault(folder_path, entries)
+
+    def update(self, inference_state, file_ios):
+        """
+        Updates the index with the given files. Files that are not part of
+        ``file_ios`` anymore are removed from the index, files that changed
+        are parsed again. Saves the folders that changed.
+        """
+        entries = {}
+        paths = []
+        changed_folders = set()
+        for file_io in file_ios:
+            path = file_io.path
+            folder_path, file_name = os.path.split(path)
+            folder_entries = self._get_folder_entries(folder_path)
+            key = get_stat_key(path)
+            if key is None:
+                if folder_entries.pop(file_name, None) is not None:
+                    changed_folders.add(folder_path)
+                continue
+
+            entry = folder_entries.get(file_name)
+            if entry is None or entry[0] != key:
+                try:
+                    module_node = inference_state.parse(file_io=file_io, cache=False)
+                except (FileNotFoundError, IOError):
+                    continue
+                entry = folder_entries[file_name] = key, get_indexed_names(module_node)
+                changed_folders.add(folder_path)
+            entries[path] = entry
+            paths.append(path)
+
+        for folder_path in changed_folders:
+            # Files that were deleted are still in the folder's entries.
+            folder_entries = self._folders[folder_path]
+            for file_name in list(folder_entries):
+                path = os.path.join(folder_path, file_name)
+                if path not in entries and not os.path.exists(path):
+                    del folder_entries[file_name]
+            debug.dbg('Saving symbol index for %s', folder_path)
+            _save_index_file(_get_index_path('symbol_index', folder_path), folder_entries)
+        self._entries = entries
+        self._paths = paths
+
+    def get_names(self, path):
+        """
+        Returns the :class:`IndexedName` objects of a file or an empty list
+        if the file is not indexed.
+        """
+        try:
+            return self._entries[path][1]
+        except KeyError:
+            return []
+
+    def find_paths(self, string_name, complete=False, all_scopes=False):
+        """
+        Returns the paths of all files that define ``string_name``. Names are
+        compared case insensitively like in
+        :func:`medi.api.completion.search_in_module`.
+
+        :param complete: If True, ``string_name`` only needs to be a prefix.
+        :param all_scopes: If True, also searches definitions that are not on
+            the module level.
+        """
+        string_name = string_name.lower()
+        for path in self._paths:
+            for n in self._entries[path][1]:
+                if not all_scopes and not n.is_module_scope:
+                    continue
+                lowered = n.string_name.lower()
+                if lowered == string_name \
+                        or complete and lowered.startswith(string_name):
+                    yield path
+                    break
+
+
+def get_identifiers(code, version_info):
+    """
+    Returns all the names that are used in ``code`` by running the marso
+    tokenizer over it. Names in strings and comments are ignored.
+    """
+    name_type = PythonTokenTypes.NAME
+    return frozenset(
+        token.string for token in tokenize(code, version_info)
+        if token.type == name_type
+    )
+
+
+class IdentifierIndex(object):
+    """
+    An inverted index of the identifiers used by the Python files of a single
+    folder. Indexes are stored per folder, so a search only has to load the
+    indexes of the folders it actually walks.
+    """
+    def __init__(self, folder_path, entries=None):
+        self.folder_path = folder_path
+        # Dict[str, Tuple[Tuple[float, int], FrozenSet[str]]]
+        self._entries = {} if entries is None else entries
+        self._postings = None
+        self.changed = False
+
+    @classmethod
+    def load(cls, folder_path):
+        entries = _load_index_file(_get_index_path('identifier_index', folder_path))
+        return cls(folder_path, entries)
+
+    def save(self):
+        _save_index_file(_get_index_path('identifier_index', self.folder_path), self._entries)
+        self.changed = False
+
+    def _get_postings(self):
+        if self._postings is None:
+            postings = {}
+            for file_name, (key, identifiers) in self._entries.items():
+                for identifier in identifiers:
+                    postings.setdefault(identifier, set()).add(file_name)
+            self._postings = postings
+        return self._postings
+
+    def get_file_names(self, string_name):
+        """
+        Returns the names of the files in this folder that used
+        ``string_name`` when they were indexed.
+        """
+        return self._get_postings().get(string_name, set())
+
+    def is_up_to_date(self, path):
+        """
+        Returns True if the file has been indexed and did not change since.
+        """
+        entry = self._entries.get(os.path.basename(path))
+        return entry is not None and entry[0] == get_stat_key(path)
+
+    def add_file(self, path, key, identifiers):
+        """
+        Adds the identifiers of a file that has been tokenized elsewhere, e.g.
+        in a worker process.
+        """
+        self._set_identifiers(os.path.basename(path), (key, identifiers))
+
+    def check_file(self, inference_state, file_io, string_name):
+        """
+        Checks if a file uses ``string_name``. Files are only read if they are
+        not indexed or if they changed.
+
+        :returns: A tuple ``(contains, code)``. ``code`` is the decoded content
+            of the file if it had to be read, otherwise None.
+        :raises FileNotFoundError: If the file does not exist.
+        """
+        file_name = os.path.basename(file_io.path)
+        key = get_stat_key(file_io.path)
+        if key is None:
+            self._set_identifiers(file_name, None)
+            raise FileNotFoundError(file_io.path)
+
+        entry = self._entries.get(file_name)
+        if entry is not None and entry[0] == key:
+            return file_name in self.get_file_names(string_name), None
+
+        code = python_bytes_to_unicode(file_io.read(), errors='replace')
+        identifiers = get_identifiers(code, inference_state.grammar.version_info)
+        self._set_identifiers(file_name, (key, identifiers))
+        return string_name in identifiers, code
+
+    def _set_identifiers(self, file_name, entry):
+        old = self._entries.pop(file_name, None)
+        if old is None and entry is None:
+            return
+        if entry is not None:
+            self._entries[file_name] = entry
+        self.changed = True
+
+        if self._postings is not None:
+            # Keep the postings up to date instead of rebuilding them.
+            if old is not None:
+                for identifier in old[1]:
+                    self._postings[identifier].discard(file_name)
+            if entry is not None:
+                for identifier in entry[1]:
+                    self._postings.setdefault(identifier, set()).add(file_name)
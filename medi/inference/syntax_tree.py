@@ -85,6 +85,10 @@ def _limit_value_infers(func):
 
 
 def infer_node(context, element):
+    inference_state = context.inference_state
+    inference_state.check_cancelled()
+    if inference_state.deadline is not None and inference_state.is_out_of_time():
+        return NO_VALUES
     if isinstance(context, CompForContext):
         return _infer_node(context, element)
 
@@ -26,7 +26,7 @@ from medi.inference.base_value import ValueSet, NO_VALUES, HelperValueMixin, \
     ValueWrapper
 from medi.inference.lazy_value import LazyKnownValues
 from medi.inference.helpers import infer_call_of_leaf
-from medi.inference.cache import inference_state_method_cache
+from medi.inference.cache import inference_state_method_cache, add_module_dependency
 
 _sentinel = object()
 
@@ -53,6 +53,9 @@ def _internal_check_array_additions(context, sequence):
 
     debug.dbg('Dynamic array search for %s' % sequence, color='MAGENTA')
     module_context = context.get_root_context()
+    if context.is_module():
+        # The additions can be anywhere in the module.
+        add_module_dependency(context)
     if not settings.dynamic_array_additions or module_context.is_compiled():
         debug.dbg('Dynamic array search aborted.', color='MAGENTA')
         return NO_VALUES
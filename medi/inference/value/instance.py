@@ -7,7 +7,8 @@ from medi import settings
 from medi.inference import compiled
 from medi.inference.compiled.value import CompiledValueFilter
 from medi.inference.helpers import values_from_qualified_names, is_big_annoying_library
-from medi.inference.filters import AbstractFilter, AnonymousFunctionExecutionFilter
+from medi.inference.filters import AbstractFilter, AnonymousFunctionExecutionFilter, \
+    get_attribute_definition_names
 from medi.inference.names import ValueName, TreeNameDefinition, ParamName, \
     NameWrapper
 from medi.inference.base_value import Value, NO_VALUES, ValueSet, \
@@ -413,6 +414,8 @@ class CompiledInstanceName(compiled.CompiledName):
         )
         self._instance = instance
         self._class_member_name = name
+        # Bound methods have the same API type and docstring as the function.
+        self._member_info = getattr(name, '_member_info', None)
 
     @iterator_to_value_set
     def infer(self):
@@ -575,6 +578,14 @@ class SelfAttributeFilter(ClassFilter):
         )
         self._instance = instance
 
+    def values(self):
+        names_by_key = get_attribute_definition_names(self._used_names, self._parser_scope)
+        return self._convert_names(
+            name
+            for names in names_by_key.values()
+            for name in self._filter(names)
+        )
+
     def _filter(self, names):
         start, end = self._parser_scope.start_pos, self._parser_scope.end_pos
         names = [n for n in names if start < n.start_pos < end]
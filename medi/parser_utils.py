@@ -1,5 +1,4 @@
 import re
-import textwrap
 from inspect import cleandoc
 from weakref import WeakKeyDictionary
 
@@ -172,6 +171,7 @@ def get_signature(funcdef, width=72, call_string=None,
         rtype = ""
     code = call_string + p + rtype
 
+    import textwrap
     return '\n'.join(textwrap.wrap(code, width))
 
 
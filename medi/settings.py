@@ -23,6 +23,7 @@ Filesystem cache
 ~~~~~~~~~~~~~~~~
 
 .. autodata:: cache_directory
+.. autodata:: parse_tree_cache_size
 
 
 Parser
@@ -40,10 +41,25 @@ Dynamic stuff
 .. autodata:: auto_import_modules
 
 
+Searching
+~~~~~~~~~
+
+.. autodata:: reference_search_processes
+
+
+Environments
+~~~~~~~~~~~~
+
+.. autodata:: environment_subprocesses
+.. autodata:: environment_subprocess_memory_limit
+
+
 Caching
 ~~~~~~~
 
 .. autodata:: call_signatures_validity
+.. autodata:: memoize_cache_size
+.. autodata:: session_memoize_cache_size
 
 
 """
@@ -86,6 +102,14 @@ On Linux, if the environment variable ``$XDG_CACHE_HOME`` is set,
 ``$XDG_CACHE_HOME/medi`` is used instead of the default one.
 """
 
+parse_tree_cache_size = 500e6  # 500 Megabytes
+"""
+The maximum size of the pickled parser trees in :attr:`cache_directory`.
+Trees of modules that are not edited by the user (libraries, stubs, etc.) are
+cached there and shared between processes. If the cache grows larger, the
+least recently used trees are removed.
+"""
+
 # ----------------
 # Parser
 # ----------------
@@ -140,6 +164,42 @@ This improves autocompletion for libraries that use ``setattr`` or
 ``globals()`` modifications a lot.
 """
 
+# ----------------
+# Searching
+# ----------------
+
+reference_search_processes = 0
+"""
+The number of worker processes that read, tokenize and parse candidate files
+when searching for references in other modules. With ``0`` (the default)
+everything happens in the current process. Results are the same in both
+modes; inference itself always stays in the current process.
+"""
+
+# ----------------
+# Environments
+# ----------------
+
+environment_subprocesses = 1
+"""
+The number of subprocesses that are started for an environment (except for
+the :class:`.InterpreterEnvironment`). Compiled objects (e.g. of ``builtins``)
+are accessed through them. Each inference state uses one of them, so with more
+than one subprocess, scripts that are used in different threads don't have to
+wait for each other. All of them are started in the background when the first
+script uses the environment.
+"""
+
+environment_subprocess_memory_limit = None
+"""
+The maximum resident memory of an environment subprocess in bytes. A
+subprocess that uses more is replaced by a new one and stopped as soon as the
+scripts that are using it are garbage collected. ``None`` (the default) means
+that subprocesses are never replaced. The memory usage is checked after
+inference states have been deleted in the subprocess. This needs the current
+resident memory of the subprocess, which is only available on Linux.
+"""
+
 # ----------------
 # Caching Validity
 # ----------------
@@ -149,3 +209,22 @@ call_signatures_validity = 3.0
 Finding function calls might be slow (0.1-0.5s). This is not acceptible for
 normal writing. Therefore cache it for a short time.
 """
+
+memoize_cache_size = None
+"""
+The maximum number of inference results that are cached per inference state.
+Long running searches (e.g. :meth:`.Project.search` or
+:meth:`.Script.get_references` in big projects) can otherwise use a lot of
+memory. If there are more results, the least recently used ones are removed.
+``None`` (the default) means that the cache is not limited.
+
+The inference state of an :class:`.InferenceSession` is limited by
+:attr:`session_memoize_cache_size` instead.
+"""
+
+session_memoize_cache_size = 100000
+"""
+Like :attr:`memoize_cache_size`, but for the inference state of an
+:class:`.InferenceSession`, which is used for a long time and therefore
+limited by default.
+"""
@@ -188,15 +188,38 @@ def test_docstrings_for_completions(Script):
 
 def test_fuzzy_completion(Script):
     script = Script('string =  "hello"\nstring.upper')
-    assert ['isupper',
-            'upper'] == [comp.name for comp in script.complete(fuzzy=True)]
+    assert ['upper',
+            'isupper'] == [comp.name for comp in script.complete(fuzzy=True)]
+
+
+def test_complete_limit(Script, monkeypatch):
+    from medi.api import classes
+
+    code = 'import os\n' + ''.join('name_%s = 1\n' % i for i in range(100)) + 'na'
+    script = Script(code)
+    for fuzzy in (False, True):
+        completions = script.complete(fuzzy=fuzzy)
+        assert len(completions) > 100
+
+        created = []
+        init = classes.Completion.__init__
+
+        def record(self, *args, **kwargs):
+            created.append(self)
+            init(self, *args, **kwargs)
+
+        with monkeypatch.context() as m:
+            m.setattr(classes.Completion, '__init__', record)
+            limited = script.complete(fuzzy=fuzzy, limit=10)
+        assert [c.name for c in limited] == [c.name for c in completions[:10]]
+        assert len(created) == 10
 
 
 def test_math_fuzzy_completion(Script, environment):
     script = Script('import math\nmath.og')
-    expected = ['copysign', 'log', 'log10', 'log1p']
+    expected = ['log', 'log10', 'log1p', 'copysign']
     if environment.version_info.major >= 3:
-        expected.append('log2')
+        expected.insert(1, 'log2')
     completions = script.complete(fuzzy=True)
     assert expected == [comp.name for comp in completions]
     for c in completions:
@@ -225,3 +248,33 @@ def test_multi_goto(Script):
     y, = script.goto(line=4)
     assert x.line == 1
     assert y.line == 2
+
+
+def _describe(names):
+    return sorted((n.module_name, n.line, n.column, n.name) for n in names)
+
+
+def test_infer_many(Script):
+    code = 'import os\nx = 1\ny = os.path.join(x)\nx, y, str'
+    script = Script(code)
+    positions = [(4, 7), (4, 0), (3, 10), (4, 3), (4, 0)]
+    results = script.infer_many(positions)
+    assert [pos for pos, definitions in results] == sorted(set(positions))
+    for (line, column), definitions in results:
+        expected = Script(code).infer(line, column)
+        assert _describe(definitions) == _describe(expected)
+    assert [d.name for d in dict(results)[4, 7]] == ['str']
+
+    with pytest.raises(ValueError):
+        script.infer_many([(5, 0)])
+
+
+def test_goto_all_names(Script):
+    code = 'import os\nclass Foo:\n    def bar(self, a):\n        return os.path\nFoo().bar'
+    script = Script(code)
+    results = script.goto_all_names(follow_imports=True)
+    names = [n.name for n, definitions in results]
+    assert names == ['os', 'Foo', 'bar', 'self', 'a', 'os', 'path', 'Foo', 'bar']
+    for name, definitions in results:
+        expected = Script(code).goto(name.line, name.column, follow_imports=True)
+        assert _describe(definitions) == _describe(expected)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+
+import pytest
+
+from medi import AsyncScript, CancellationToken, Cancelled, InferenceSession, \
+    Project, Script
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def test_async_complete(loop, environment):
+    script = AsyncScript('import json\njson.loads', environment=environment)
+    completions = loop.run_until_complete(script.complete(2, 7))
+    assert [c.name for c in completions] == ['load', 'loads']
+
+    definitions = loop.run_until_complete(script.infer(2, 6))
+    assert [d.name for d in definitions] == ['loads']
+
+
+def test_async_cancel(loop, environment):
+    script = AsyncScript('import json\njson.lo', environment=environment)
+    script.cancel()
+    with pytest.raises(Cancelled):
+        loop.run_until_complete(script.complete())
+
+
+class _CountingToken(CancellationToken):
+    def __init__(self, checkpoints):
+        super(_CountingToken, self).__init__()
+        self.checkpoints = checkpoints
+
+    def raise_if_cancelled(self):
+        self.checkpoints -= 1
+        if self.checkpoints == 0:
+            self.cancel()
+        super(_CountingToken, self).raise_if_cancelled()
+
+
+def test_cancel_during_inference(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    code = 'def foo():\n    return [1]\n\nx = foo()[0]\nx'
+
+    token = _CountingToken(checkpoints=3)
+    script = Script(code, path=path, session=session, cancellation_token=token)
+    with pytest.raises(Cancelled):
+        script.infer(5, 0)
+    assert token.cancelled
+
+    # The caches of the session must not contain results of the cancelled
+    # request.
+    script = Script(code, path=path, session=session)
+    assert [d.name for d in script.infer(5, 0)] == ['int']
+
+
+def test_cancel_in_session(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    code = 'def foo():\n    return [1]\n\nx = foo()[0]\nx'
+
+    token = _CountingToken(checkpoints=3)
+    script = Script(code, path=path, session=session, cancellation_token=token)
+    # Scripts of the same session don't replace the token of the script.
+    other = Script(code, path=path, session=session)
+    with pytest.raises(Cancelled):
+        script.infer(5, 0)
+    assert [d.name for d in other.infer(5, 0)] == ['int']
+
+
+def test_cancel_goto_all_names(environment):
+    token = CancellationToken()
+    script = Script('import os\nos.path\n', environment=environment,
+                    cancellation_token=token)
+    token.cancel()
+    with pytest.raises(Cancelled):
+        script.goto_all_names()
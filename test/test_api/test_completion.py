@@ -6,7 +6,7 @@ from textwrap import dedent
 import pytest
 
 from ..helpers import root_dir
-from medi.api.helpers import _start_match, _fuzzy_match
+from medi.api.helpers import _start_match, _fuzzy_match, fuzzy_score
 from medi._compatibility import scandir
 
 
@@ -131,6 +131,30 @@ def test_fuzzy_match():
     assert _fuzzy_match('Condition', 'ii')
     assert not _fuzzy_match('Condition', 'Ciito')
     assert _fuzzy_match('Condition', 'Cdiio')
+    assert _fuzzy_match('Condition', '')
+
+
+def test_fuzzy_score():
+    assert fuzzy_score('Condition', 'p') is None
+    assert fuzzy_score('Condition', 'cdn') is None
+    assert fuzzy_score('Condition', 'cdn', ignore_case=True) is not None
+
+    def ranked(like_name, names):
+        return sorted(names, key=lambda name: -fuzzy_score(name, like_name, ignore_case=True))
+
+    # Exact prefixes first, then word starts, then scattered characters.
+    assert ranked('upper', ['isupper', 'upper']) == ['upper', 'isupper']
+    assert ranked('gs', ['ignores', 'get_string']) == ['get_string', 'ignores']
+    assert ranked('gs', ['gauss', 'gotSomething']) == ['gotSomething', 'gauss']
+    assert ranked('log', ['log10', 'log', 'catalog']) == ['log', 'log10', 'catalog']
+
+
+def test_fuzzy_score_unicode(Script, skip_python2):
+    # The dotted capital I gets longer when it's lowered.
+    assert fuzzy_score(u'\u0130xyz', u'z', ignore_case=True) is not None
+    assert fuzzy_score(u'\u0130xyz', u'ix', ignore_case=True) is not None
+    completions = Script(u'\u0130xyz = 1\nz').complete(fuzzy=True)
+    assert u'\u0130xyz' in [c.name for c in completions]
 
 
 def test_ellipsis_completion(Script):
@@ -166,3 +190,36 @@ def test_completion_cache(Script, module_injector):
     assert cls.type == 'class'
     assert cls.docstring() == 'foo()\n\ndoc2'
 
+
+def test_module_names_cache(Script, tmpdir):
+    from medi import Project
+
+    tmpdir.join('cached_module_a.py').write('')
+    project = Project(tmpdir.mkdir('project').strpath, added_sys_path=[tmpdir.strpath])
+
+    def complete():
+        completions = Script('import cached_module_', project=project).complete()
+        return [c.name for c in completions]
+
+    assert complete() == ['cached_module_a']
+    mtime = os.stat(tmpdir.strpath).st_mtime
+
+    # The directory is only listed again if its modification time changes.
+    tmpdir.join('cached_module_b.py').write('')
+    os.utime(tmpdir.strpath, (mtime, mtime))
+    assert complete() == ['cached_module_a']
+
+    os.utime(tmpdir.strpath, (mtime + 1, mtime + 1))
+    assert complete() == ['cached_module_a', 'cached_module_b']
+
+    # Changes in subdirectories (e.g. a new __init__.py) are noticed as well.
+    package = tmpdir.mkdir('cached_module_pkg')
+    assert complete() == ['cached_module_a', 'cached_module_b', 'cached_module_pkg']
+    mtime = os.stat(tmpdir.strpath).st_mtime
+    tmpdir.join('cached_module_c.py').write('')
+    os.utime(tmpdir.strpath, (mtime, mtime))
+    package_mtime = os.stat(package.strpath).st_mtime
+    package.join('__init__.py').write('')
+    os.utime(package.strpath, (package_mtime + 1, package_mtime + 1))
+    assert complete() == ['cached_module_a', 'cached_module_b', 'cached_module_c',
+                          'cached_module_pkg']
@@ -0,0 +1,223 @@
+import gc
+import os
+import time
+import threading
+
+import pytest
+
+import medi
+from medi import settings
+from medi.api.exceptions import InternalError
+from medi.api.environment import InterpreterEnvironment, create_environment
+
+
+@pytest.fixture
+def new_environment(environment):
+    if isinstance(environment, InterpreterEnvironment):
+        pytest.skip("The interpreter environment does not use subprocesses")
+    return lambda: create_environment(environment.executable, safe=False)
+
+
+@pytest.fixture
+def pooled_environment(new_environment, monkeypatch):
+    monkeypatch.setattr(settings, 'environment_subprocesses', 2)
+    return new_environment()
+
+
+def _get_subprocess(script):
+    return script._inference_state.compiled_subprocess._compiled_subprocess
+
+
+def test_subprocess_pool(pooled_environment):
+    script1 = medi.Script('str.upp', environment=pooled_environment)
+    script2 = medi.Script('str.upp', environment=pooled_environment)
+    assert _get_subprocess(script1) is not _get_subprocess(script2)
+    assert [c.name for c in script1.complete()] == ['upper']
+    assert [c.name for c in script2.complete()] == ['upper']
+
+
+def test_replace_crashed_subprocess(pooled_environment):
+    script = medi.Script('str.upp', environment=pooled_environment)
+    crashed = _get_subprocess(script)
+    crashed._kill()
+
+    # Both subprocesses are used, one of them is the replacement.
+    scripts = [medi.Script('str.upp', environment=pooled_environment)
+               for _ in range(2)]
+    assert crashed not in [_get_subprocess(s) for s in scripts]
+    for s in scripts:
+        assert [c.name for c in s.complete()] == ['upper']
+
+
+def test_crash_callback_without_lock(new_environment):
+    compiled_subprocess = new_environment()._get_subprocess()
+    locked = []
+    compiled_subprocess.crash_callback = lambda s: locked.append(s._lock.locked())
+    process = compiled_subprocess._get_process()
+    process.kill()
+    process.wait()
+
+    with pytest.raises(InternalError):
+        compiled_subprocess.get_sys_path()
+    # The pool takes its own lock in the callback, which would deadlock with
+    # get_subprocess if the lock of the subprocess was still held.
+    assert locked == [False]
+    with pytest.raises(InternalError):
+        compiled_subprocess.get_sys_path()
+    assert locked == [False]
+
+
+def test_deletions_are_debounced(new_environment, monkeypatch):
+    from medi.inference.compiled import subprocess
+    monkeypatch.setattr(subprocess, '_DELETION_INTERVAL', 1)
+    environment = new_environment()
+    compiled_subprocess = environment._get_subprocess()
+    sent = []
+
+    def flush_deletions():
+        sent.append(len(compiled_subprocess._inference_state_deletion_queue))
+        flush()
+
+    flush = compiled_subprocess.flush_deletions
+    monkeypatch.setattr(compiled_subprocess, 'flush_deletions', flush_deletions)
+    scripts = [medi.Script('str.upp', environment=environment) for _ in range(5)]
+    for script in scripts:
+        script.complete()
+    del script
+    while scripts:
+        scripts.pop()
+        gc.collect()
+        time.sleep(0.4)
+    for _ in range(50):
+        if sent:
+            break
+        time.sleep(0.1)
+    # All the deletions are sent with one request.
+    assert sent == [5]
+
+
+def test_subprocess_pool_threads(pooled_environment):
+    results = []
+
+    def complete():
+        script = medi.Script('import os\nos.path.joi', environment=pooled_environment)
+        results.append([c.name for c in script.complete()])
+
+    threads = [threading.Thread(target=complete) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [['join'], ['join']]
+
+
+def test_subprocess_stats(new_environment):
+    environment = new_environment()
+    script = medi.Script('import math\nmath.si', environment=environment)
+    script.complete()
+    stats, = environment.get_subprocess_stats()
+    assert stats['inference_states'] == 1
+    assert stats['access_handles'] > 0
+
+    compiled_subprocess = _get_subprocess(script)
+    del script
+    gc.collect()
+    # Usually done by a background thread.
+    compiled_subprocess.flush_deletions()
+    assert compiled_subprocess.stats['inference_states'] == 0
+    assert compiled_subprocess.stats['access_handles'] == 0
+
+
+def test_subprocess_memory_limit(new_environment, monkeypatch):
+    environment = new_environment()
+    script1 = medi.Script('str.upp', environment=environment)
+    old_subprocess = _get_subprocess(script1)
+    environment.get_subprocess_stats()
+
+    monkeypatch.setattr(settings, 'environment_subprocess_memory_limit', 1)
+    script2 = medi.Script('str.upp', environment=environment)
+    assert _get_subprocess(script2) is not old_subprocess
+    # The retired subprocess is still used by the first script.
+    assert old_subprocess.is_retired
+    assert [c.name for c in script1.complete()] == ['upper']
+    assert [c.name for c in script2.complete()] == ['upper']
+
+    del script1
+    gc.collect()
+    old_subprocess.flush_deletions()
+    assert old_subprocess.is_crashed
+
+
+def test_retired_subprocess_stops_in_background(new_environment, monkeypatch):
+    environment = new_environment()
+    script1 = medi.Script('str.upp', environment=environment)
+    old_subprocess = _get_subprocess(script1)
+    environment.get_subprocess_stats()
+
+    monkeypatch.setattr(settings, 'environment_subprocess_memory_limit', 1)
+    medi.Script('str.upp', environment=environment)
+    assert old_subprocess.is_retired
+    del script1
+    gc.collect()
+    # The deletion thread is woken up by the deletion of the inference state.
+    for _ in range(50):
+        if old_subprocess.is_crashed:
+            break
+        time.sleep(0.1)
+    assert old_subprocess.is_crashed
+
+
+@pytest.mark.skipif('os.name == "nt"', reason="Virtualenvs have a different layout")
+def test_find_virtualenvs_cached(tmpdir, environment, monkeypatch):
+    from medi.api.environment import find_virtualenvs
+    from medi.inference.compiled.subprocess import CompiledSubprocess
+
+    for name in ('venv1', 'venv2', 'venv3'):
+        tmpdir.join(name, 'bin').ensure(dir=True)
+        os.symlink(environment.executable, tmpdir.join(name, 'bin', 'python').strpath)
+    tmpdir.join('no_venv').ensure(dir=True)
+
+    def find():
+        return list(find_virtualenvs([tmpdir.strpath], safe=False,
+                                     use_environment_vars=False))
+
+    environments = find()
+    assert len(environments) == 3
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Should not start a subprocess")
+
+    # The second time everything comes from the cache.
+    monkeypatch.setattr(CompiledSubprocess, '_send', fail)
+    cached = find()
+    assert [e.version_info for e in cached] == [e.version_info for e in environments]
+    assert [e.path for e in cached] == [e.path for e in environments]
+
+
+@pytest.mark.skipif('os.name == "nt"', reason="Virtualenvs have a different layout")
+def test_find_virtualenvs_failure_not_cached(tmpdir, environment, monkeypatch):
+    from medi.api.environment import find_virtualenvs
+    from medi.inference.compiled.subprocess import CompiledSubprocess
+
+    tmpdir.join('venv', 'bin').ensure(dir=True)
+    os.symlink(environment.executable, tmpdir.join('venv', 'bin', 'python').strpath)
+
+    def find():
+        return list(find_virtualenvs([tmpdir.strpath], safe=False,
+                                     use_environment_vars=False))
+
+    def fail(*args, **kwargs):
+        raise OSError("Broken executable")
+
+    with monkeypatch.context() as m:
+        m.setattr(CompiledSubprocess, '_send', fail)
+        assert find() == []
+
+    assert len(find()) == 1
+
+
+def test_subprocess_cache_directory(new_environment, tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, 'cache_directory', tmpdir.strpath)
+    compiled_subprocess = new_environment()._get_subprocess()
+    code = '__import__("medi.settings").settings.cache_directory'
+    assert compiled_subprocess._send(None, eval, (code,)) == tmpdir.strpath
@@ -131,3 +131,143 @@ def test_complete_search(Script, string, completions, all_scopes, skip_pre_pytho
     project = Project(test_dir)
     defs = project.complete_search(string, all_scopes=all_scopes)
     assert [d.complete for d in defs] == completions
+
+
+def test_symbol_index(tmpdir, monkeypatch, inference_state):
+    from medi.file_io import FileIO
+    from medi.inference import symbol_index
+    from medi.inference.symbol_index import SymbolIndex
+
+    mod = tmpdir.join('mod.py')
+    mod.write('class Foo:\n    def bar(self, x):\n        y = 1\n\nbaz = 3\n')
+    project_path = tmpdir.strpath
+    index = SymbolIndex(project_path)
+    index.update(inference_state, [FileIO(mod.strpath)])
+
+    assert [(n.qualified_name, n.type, n.is_module_scope)
+            for n in index.get_names(mod.strpath)] == [
+        ('Foo', 'class', True),
+        ('Foo.bar', 'function', False),
+        ('Foo.bar.self', 'param', False),
+        ('Foo.bar.x', 'param', False),
+        ('Foo.bar.y', 'statement', False),
+        ('baz', 'statement', True),
+    ]
+    assert list(index.find_paths('BAZ')) == [mod.strpath]
+    assert list(index.find_paths('bar')) == []
+    assert list(index.find_paths('bar', all_scopes=True)) == [mod.strpath]
+    assert list(index.find_paths('ba', complete=True)) == [mod.strpath]
+
+    # The index is persisted and invalidated if the file changes.
+    def parse(*args, **kwargs):
+        raise AssertionError('The file should not be parsed again')
+
+    loaded = SymbolIndex(project_path)
+    with monkeypatch.context() as m:
+        m.setattr(inference_state, 'parse', parse)
+        loaded.update(inference_state, [FileIO(mod.strpath)])
+    assert loaded.get_names(mod.strpath) == index.get_names(mod.strpath)
+
+    # Only the folders of changed files are written again.
+    other = tmpdir.mkdir('sub').join('other.py')
+    other.write('other = 1\n')
+    file_ios = [FileIO(mod.strpath), FileIO(other.strpath)]
+    loaded.update(inference_state, file_ios)
+    saved = []
+    monkeypatch.setattr(symbol_index, '_save_index_file', lambda path, data: saved.append(path))
+    mod.write('qux = 1\n')
+    loaded.update(inference_state, file_ios)
+    assert [n.string_name for n in loaded.get_names(mod.strpath)] == ['qux']
+    assert saved == [symbol_index._get_index_path('symbol_index', tmpdir.strpath)]
+    loaded.update(inference_state, [FileIO(mod.strpath)])
+
+    loaded.update(inference_state, [])
+    assert loaded.get_names(mod.strpath) == []
+
+
+@pytest.mark.skipif(sys.version_info < (3, 6), reason="Ignore Python 2, because EOL")
+def test_index_update_on_changed_file(tmpdir, skip_pre_python36):
+    tmpdir.join('indexed_mod.py').write('def indexed_function(): pass\n')
+    project = Project(tmpdir.strpath)
+    defs = project.complete_search('indexed_f')
+    assert [d.name for d in defs] == ['indexed_function']
+
+    tmpdir.join('indexed_mod.py').write('def indexed_function_renamed(): pass\n')
+    defs = project.search('indexed_function_renamed')
+    assert [d.name for d in defs] == ['indexed_function_renamed']
+
+
+@pytest.mark.skipif(sys.version_info < (3, 6), reason="Ignore Python 2, because EOL")
+def test_typeshed_index(tmpdir, monkeypatch, skip_pre_python36):
+    from medi.inference.gradual import typeshed
+
+    typeshed_dir = tmpdir.mkdir('typeshed')
+    stdlib = typeshed_dir.mkdir('stdlib')
+    stdlib.mkdir('2and3').join('foo.pyi').write('def stub_function() -> int: ...\n')
+    package = stdlib.mkdir('3').mkdir('pkg')
+    package.join('__init__.pyi').write('')
+    package.join('sub.pyi').write('class StubClass:\n    def method(self) -> None: ...\n')
+    typeshed_dir.mkdir('third_party').mkdir('2and3')
+
+    monkeypatch.setattr(typeshed, 'TYPESHED_PATH', typeshed_dir.strpath)
+    monkeypatch.setattr(typeshed, '_version_cache', {})
+    monkeypatch.setattr(typeshed, '_stub_index', None)
+    # The index is built on first use and stored in the cache directory.
+    typeshed._cache_stub_file_map(sys.version_info)
+    assert typeshed.find_stub_modules(sys.version_info, 'stub_function')
+    monkeypatch.setattr(typeshed, '_version_cache', {})
+    monkeypatch.setattr(typeshed, '_stub_index', None)
+
+    def listdir(path):
+        raise AssertionError('typeshed should not be listed')
+
+    # Everything is read from the index.
+    with monkeypatch.context() as m:
+        m.setattr(os, 'listdir', listdir)
+        m.setattr(os, 'walk', listdir)
+        stub_map = typeshed._cache_stub_file_map(sys.version_info)
+        assert stub_map['foo'] == stdlib.join('2and3', 'foo.pyi').strpath
+        assert stub_map['pkg'] == package.join('__init__.pyi').strpath
+        assert list(typeshed.find_stub_modules(sys.version_info, 'stubclass')) \
+            == [('pkg.sub', package.join('sub.pyi').strpath)]
+        assert list(typeshed.find_stub_modules(sys.version_info, 'stub_')) == []
+        assert list(typeshed.find_stub_modules(sys.version_info, 'stub_', complete=True)) \
+            == [('foo', stdlib.join('2and3', 'foo.pyi').strpath)]
+        assert list(typeshed.find_stub_modules(sys.version_info, 'method')) == []
+
+    project = Project(tmpdir.mkdir('project').strpath)
+    defs = project.search('StubClass')
+    assert [d.full_name for d in defs] == ['pkg.sub.StubClass']
+
+
+@pytest.mark.skipif(sys.version_info < (3, 6), reason="Ignore Python 2, because EOL")
+def test_typeshed_index_is_lazy(tmpdir, monkeypatch, skip_pre_python36):
+    from medi.inference.gradual import typeshed
+
+    typeshed_dir = tmpdir.mkdir('typeshed')
+    stubs = typeshed_dir.mkdir('stdlib').mkdir('2and3')
+    for name in ('first', 'bar', 'last'):
+        stubs.join(name + '.pyi').write('def bar() -> int: ...\n')
+    typeshed_dir.mkdir('third_party').mkdir('2and3')
+
+    monkeypatch.setattr(typeshed, 'TYPESHED_PATH', typeshed_dir.strpath)
+    monkeypatch.setattr(typeshed, '_stub_index', None)
+    parsed = []
+    build_stub_names = typeshed._build_stub_names
+
+    def record(typeshed_path, path):
+        parsed.append(path)
+        return build_stub_names(typeshed_path, path)
+
+    monkeypatch.setattr(typeshed, '_build_stub_names', record)
+    # The stub with the matching module name is parsed first and the others
+    # are only parsed if they are searched.
+    modules = typeshed.find_stub_modules(sys.version_info, 'bar')
+    assert next(modules) == ('bar', stubs.join('bar.pyi').strpath)
+    assert parsed == [os.path.join('stdlib', '2and3', 'bar.pyi')]
+    modules.close()
+
+    # The names that are known are stored in the index.
+    monkeypatch.setattr(typeshed, '_stub_index', None)
+    assert len(list(typeshed.find_stub_modules(sys.version_info, 'bar'))) == 3
+    assert len(parsed) == 3
@@ -0,0 +1,187 @@
+import os
+
+import pytest
+
+from medi import InferenceSession, Script, Project, settings
+
+
+def test_session_reuses_inference_state(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    code = 'import json\njson.lo'
+
+    script1 = Script(code, path=path, session=session)
+    assert [c.name for c in script1.complete()] == ['load', 'loads']
+    script2 = Script(code, path=path, session=session)
+    assert script2._inference_state is script1._inference_state
+    assert script2._get_module() is script1._get_module()
+    assert [c.name for c in script2.complete()] == ['load', 'loads']
+
+    # Other directories need a different sys path.
+    other = os.path.join(tmpdir.strpath, 'sub', 'mod.py')
+    script3 = Script(code, path=other, session=session)
+    assert script3._inference_state is not script1._inference_state
+
+
+def test_session_changed_code(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+
+    script = Script('def foo(): return 1\nx = foo()\nx', path=path, session=session)
+    assert [d.name for d in script.infer(3, 0)] == ['int']
+    module = script._get_module()
+
+    script = Script('def foo(): return ""\nx = foo()\nx', path=path, session=session)
+    assert [d.name for d in script.infer(3, 0)] == ['str']
+    assert script._get_module() is not module
+
+
+def test_session_changed_file(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    imported = tmpdir.join('imported.py')
+    imported.write('value = 1\n')
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    code = 'import imported\nimported.value'
+
+    script = Script(code, path=path, session=session)
+    assert [d.name for d in script.infer(2, 10)] == ['int']
+
+    imported.write('value = "a string"\n')
+    mtime = os.path.getmtime(imported.strpath) + 1
+    os.utime(imported.strpath, (mtime, mtime))
+    script = Script(code, path=path, session=session)
+    assert [d.name for d in script.infer(2, 10)] == ['str']
+
+    # Without a session, modification times are not needed.
+    script = Script(code, path=path, environment=environment)
+    assert [d.name for d in script.infer(2, 10)] == ['str']
+    assert not script._inference_state.module_cache._last_modified
+
+
+def test_session_keeps_unrelated_results(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    tmpdir.join('a.py').write('value = 1\n')
+    tmpdir.join('b.py').write('value = ""\n')
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    script = Script('import a, b\na.value\nb.value', path=path, session=session)
+    assert [d.name for d in script.infer(2, 2)] == ['int']
+    assert [d.name for d in script.infer(3, 2)] == ['str']
+
+    inference_state = script._inference_state
+    module_a, = inference_state.module_cache.get(('a',))
+    module_b, = inference_state.module_cache.get(('b',))
+    dependents = inference_state.memoize_dependents
+
+    def entries(module):
+        return [entry for part in dependents[module].values() for entry in part]
+
+    a_entries = entries(module_a)
+    assert a_entries and entries(module_b)
+
+    def cached(entries):
+        cache = inference_state.memoize_cache
+        return [key for function, key in entries if key in cache[function]]
+
+    inference_state.invalidate_module(module_a)
+    assert module_a not in dependents
+    assert not cached(a_entries)
+    assert cached(entries(module_b))
+
+
+def test_session_keeps_unchanged_definitions(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    code = 'def f():\n    return 1\n\n\ndef g():\n    return ""\n\n\na = f()\nb = g()\na\nb\n'
+
+    script = Script(code, path=path, session=session)
+    assert [d.name for d in script.infer(11, 0)] == ['int']
+    assert [d.name for d in script.infer(12, 0)] == ['str']
+    inference_state = script._inference_state
+    module = script._get_module()
+    g_node = module.tree_node.children[1]
+    g_entries = list(inference_state.memoize_dependents[module][g_node])
+    assert g_entries
+
+    script = Script(code.replace('return 1', 'return 1.0'), path=path, session=session)
+    assert [d.name for d in script.infer(11, 0)] == ['float']
+    assert script._get_module() is module
+    cache = inference_state.memoize_cache
+    assert all(key in cache[function] for function, key in g_entries)
+    assert [d.name for d in script.infer(12, 0)] == ['str']
+
+    # Renaming a function changes the names of the module.
+    script = Script(code.replace('def g', 'def h'), path=path, session=session)
+    assert script._get_module() is not module
+    assert not script.infer(12, 0)
+
+
+def test_session_global_statements(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+
+    def get_module(body):
+        code = 'import sys\n\n\ndef f():\n    %s\n    return 1\n' % body
+        return Script(code, path=path, session=session)._get_module()
+
+    module = get_module('global_config = 1')
+    # Comments, strings and names that contain "global" don't matter.
+    for body in ['# global', 'x = "sys.path"', 'global_config = 2']:
+        assert get_module(body) is module
+
+    for body in ['global x', 'sys.path.append("")', 'def g():\n        nonlocal x']:
+        new_module = get_module(body)
+        assert new_module is not module
+        module = new_module
+        # Removing the statement changes the module again.
+        new_module = get_module('pass')
+        assert new_module is not module
+        module = new_module
+
+
+def test_session_conflicting_arguments(environment, tmpdir):
+    project = Project(tmpdir.strpath)
+    session = InferenceSession(project, environment=environment)
+    Script('', project=project, environment=environment, session=session)
+
+    with pytest.raises(ValueError):
+        Script('', project=Project(tmpdir.strpath), session=session)
+    with pytest.raises(ValueError):
+        Script('', environment=object(), session=session)
+    with pytest.raises(ValueError):
+        Script('', sys_path=[tmpdir.strpath], session=session)
+    assert project._sys_path is None
+
+
+def test_session_memoize_cache_size(environment, tmpdir, monkeypatch):
+    monkeypatch.setattr(settings, 'session_memoize_cache_size', 30)
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    script = Script('import json\njson.loads("")', session=session)
+    assert script.infer(2, 8)
+    assert len(script._inference_state.memoize_lru) <= 30
+
+
+def test_session_cache_stays_bounded(environment, tmpdir):
+    session = InferenceSession(Project(tmpdir.strpath), environment=environment)
+    path = os.path.join(tmpdir.strpath, 'mod.py')
+    code = 'import os\n%s = "a"\ndef f():\n    return os.path.join(%s, "b")\nf().upp'
+
+    def sizes(inference_state):
+        dependents = inference_state.memoize_dependents
+        return (
+            sum(len(memo) for memo in inference_state.memoize_cache.values()),
+            sum(len(s) for parts in dependents.values() for s in parts.values()),
+            len(inference_state.memoize_lru),
+        )
+
+    measured = []
+    for i in range(20):
+        # The results of executions with arguments from the old code are
+        # removed as well.
+        script = Script(code % ('x%s' % i, 'x%s' % i), path=path, session=session)
+        assert [c.name for c in script.complete()] == ['upper']
+        measured.append(sizes(script._inference_state))
+    first_cache, first_dependents, _ = measured[1]
+    last_cache, last_dependents, last_lru = measured[-1]
+    assert last_cache <= first_cache + 10
+    assert last_dependents <= first_dependents + 50
+    assert last_lru == last_cache
@@ -15,3 +15,62 @@ def test_exclude_builtin_modules(Script):
 
     places = get(include=False)
     assert places == [(1, 7), (2, 6)]
+
+
+def test_identifier_index(tmpdir, inference_state):
+    from medi.file_io import FileIO
+    from medi.inference.symbol_index import IdentifierIndex
+
+    mod = tmpdir.join('mod.py')
+    mod.write('def used_name(): pass\n# commented_name\nx = "string_name"\n')
+    file_io = FileIO(mod.strpath)
+    index = IdentifierIndex(tmpdir.strpath)
+
+    contains, code = index.check_file(inference_state, file_io, 'used_name')
+    assert contains and code is not None
+    assert index.check_file(inference_state, file_io, 'used_name') == (True, None)
+    assert index.check_file(inference_state, file_io, 'commented_name') == (False, None)
+    assert index.check_file(inference_state, file_io, 'string_name') == (False, None)
+    assert index.get_file_names('x') == {'mod.py'}
+
+    index.save()
+    loaded = IdentifierIndex.load(tmpdir.strpath)
+    assert loaded.check_file(inference_state, file_io, 'x') == (True, None)
+
+    mod.write('new_name = 1\n')
+    contains, code = loaded.check_file(inference_state, file_io, 'new_name')
+    assert contains and code == 'new_name = 1\n'
+    assert loaded.get_file_names('x') == set()
+
+
+def test_references_in_worker_processes(Script, tmpdir, monkeypatch):
+    from medi import settings
+    from medi.inference import references
+    from medi.api.project import Project
+
+    tmpdir.join('defining.py').write('def shared_function(): pass\n')
+    for i in range(5):
+        tmpdir.join('user%s.py' % i).write(
+            'from defining import shared_function\nshared_function()\n')
+    tmpdir.join('unrelated.py').write('other_function = 1\n')
+    path = tmpdir.join('defining.py').strpath
+
+    def get_references():
+        script = Script(path=path, project=Project(tmpdir.strpath))
+        return [(d.module_name, d.line, d.column)
+                for d in script.get_references(1, 5)]
+
+    sequential = get_references()
+    assert len(sequential) == 11
+    monkeypatch.setattr(settings, 'reference_search_processes', 2)
+    # The workers use the cache directory of the main process.
+    references._terminate_process_pool()
+    cache_directory = tmpdir.join('cache')
+    monkeypatch.setattr(settings, 'cache_directory', cache_directory.strpath)
+    tmpdir.join('user0.py').write(
+        'from defining import shared_function\n\nshared_function()\n')
+    parallel = get_references()
+    assert ('user0', 3, 0) in parallel
+    assert parallel == get_references()
+    assert len(parallel) == len(sequential)
+    assert cache_directory.join('grammars').check(dir=True)
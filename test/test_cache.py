@@ -1,6 +1,9 @@
 """
 Test all things related to the ``medi.cache`` module.
 """
+import os
+
+import pytest
 
 
 def test_cache_get_signatures(Script):
@@ -27,3 +30,165 @@ def test_cache_get_signatures(Script):
 def test_cache_line_split_issues(Script):
     """Should still work even if there's a newline."""
     assert Script('int(\n').get_signatures()[0].name == 'int'
+
+
+def test_parse_tree_cache(tmpdir, monkeypatch, inference_state):
+    from marso.cache import parser_cache
+    from medi import settings
+    from medi.file_io import FileIO
+    from medi.inference import parser_cache as tree_cache
+
+    monkeypatch.setattr(settings, 'cache_directory', tmpdir.strpath)
+    path = tmpdir.join('cached_mod.py')
+    path.write('def foo():\n    return 1\n')
+
+    def parse():
+        return inference_state.parse(file_io=FileIO(path.strpath), cache=True)
+
+    module = parse()
+    assert parse() is module
+    directory = tree_cache._get_cache_directory()
+    assert len(os.listdir(directory)) == 1
+
+    # A new process would only find the pickled tree.
+    del parser_cache[inference_state.grammar._hashed][path.strpath]
+    loaded = parse()
+    assert loaded is not module
+    assert loaded.get_code() == module.get_code()
+
+    # Changing the content creates a new entry.
+    path.write('def bar():\n    return 2\n')
+    assert parse().get_code() == 'def bar():\n    return 2\n'
+    assert len(os.listdir(directory)) == 2
+
+    tree_cache.evict(size_limit=0)
+    assert os.listdir(directory) == []
+
+
+def test_memoize_cache_size(Script, monkeypatch):
+    from medi import settings
+    from medi.inference.cache import get_memoize_cache_statistics
+
+    code = 'import json\nclass Foo:\n    def bar(self): return [1]\nFoo().bar()[0].'
+    expected = [c.name for c in Script(code).complete()]
+    assert 'real' in expected
+
+    monkeypatch.setattr(settings, 'memoize_cache_size', 20)
+    script = Script(code)
+    assert [c.name for c in script.complete()] == expected
+    statistics = get_memoize_cache_statistics(script._inference_state)
+    assert statistics
+    assert sum(count for name, count, size in statistics) <= 20
+
+
+def test_member_table_cache(tmpdir, monkeypatch, Script):
+    from medi import settings
+    from medi.inference.compiled import member_cache
+
+    monkeypatch.setattr(settings, 'cache_directory', tmpdir.strpath)
+    monkeypatch.setattr(member_cache, '_tables', {})
+
+    def complete():
+        completions = Script('import math\nmath.si').complete()
+        return [(c.name, c.type, c.docstring(raw=True)) for c in completions]
+
+    expected = complete()
+    assert [name for name, type_, doc in expected] == ['sin', 'sinh']
+    assert expected[0][1] == 'function'
+
+    # A new process would only find the pickled table.
+    member_cache._tables.clear()
+    calls = []
+    access_handle_class = type(Script('')._inference_state.builtins_module.access_handle)
+    getattr_ = access_handle_class.__getattr__
+
+    def record(self, name):
+        calls.append(name)
+        return getattr_(self, name)
+
+    monkeypatch.setattr(access_handle_class, '__getattr__', record)
+    assert complete() == expected
+    assert 'get_member_table' not in calls
+
+
+@pytest.mark.parametrize('code', ['str.', 'import math\nmath.si', 'import array\narray.array.'])
+def test_member_table_cache_of_classes(tmpdir, monkeypatch, Script, code):
+    from medi import settings
+    from medi.inference.compiled import member_cache
+
+    monkeypatch.setattr(settings, 'cache_directory', tmpdir.strpath)
+    monkeypatch.setattr(member_cache, '_tables', {})
+
+    def complete():
+        return [(c.name, c.type) for c in Script(code).complete()]
+
+    expected = complete()
+    assert expected
+
+    member_cache._tables.clear()
+    calls = []
+    access_handle_class = type(Script('')._inference_state.builtins_module.access_handle)
+    getattr_ = access_handle_class.__getattr__
+
+    def record(self, name):
+        calls.append(name)
+        return getattr_(self, name)
+
+    monkeypatch.setattr(access_handle_class, '__getattr__', record)
+    assert complete() == expected
+    assert 'get_member_table' not in calls
+
+
+def test_member_table_cache_changed_module(tmpdir, monkeypatch):
+    from medi.inference.compiled import member_cache
+
+    monkeypatch.setattr(member_cache, '_tables', {})
+    path = tmpdir.join('entry.pkl').strpath
+    member_cache._save(path, ('mod', 1.0), 'table')
+    assert member_cache._load(path, ('mod', 1.0)) == 'table'
+    # The module was rebuilt while the process is running.
+    assert member_cache._load(path, ('mod', 2.0)) is None
+    assert member_cache._load(path, ('mod', 1.0)) == 'table'
+
+
+def test_grammar_cache(tmpdir, monkeypatch):
+    import marso
+    from medi import settings
+    from medi.inference import grammar_cache
+
+    monkeypatch.setattr(settings, 'cache_directory', tmpdir.strpath)
+    monkeypatch.setattr(grammar_cache, '_grammars', {})
+
+    grammar = grammar_cache.load_grammar(version='3.7')
+    assert grammar_cache.load_grammar(version='3.7') is grammar
+
+    # A new process would only find the pickled grammar.
+    grammar_cache._grammars.clear()
+
+    def generate(**kwargs):
+        raise AssertionError('The grammar should not be generated again')
+
+    monkeypatch.setattr(marso, 'load_grammar', generate)
+    loaded = grammar_cache.load_grammar(version='3.7')
+    assert loaded is not grammar
+    assert loaded._hashed == grammar._hashed
+    code = 'def foo(x):\n    if x:\n        return [1, 2]\n'
+    module = loaded.parse(code)
+    assert module.get_code() == code
+    assert [f.name.value for f in module.iter_funcdefs()] == ['foo']
+    assert not list(loaded.iter_errors(module))
+
+
+def test_grammar_cache_not_writable(tmpdir, monkeypatch):
+    import tempfile
+    from medi import settings
+    from medi.inference import grammar_cache
+
+    monkeypatch.setattr(settings, 'cache_directory', tmpdir.strpath)
+    monkeypatch.setattr(grammar_cache, '_grammars', {})
+
+    def mkstemp(*args, **kwargs):
+        raise OSError('Permission denied')
+
+    monkeypatch.setattr(tempfile, 'mkstemp', mkstemp)
+    assert grammar_cache.load_grammar(version='3.7')
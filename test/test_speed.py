@@ -3,10 +3,15 @@ Speed tests of Medi. To prove that certain things don't take longer than they
 should.
 """
 
+import os
+import sys
 import time
 import functools
+import subprocess
 
-from .helpers import get_example_dir
+import pytest
+
+from .helpers import get_example_dir, root_dir
 import medi
 
 
@@ -47,3 +52,206 @@ def test_precedence_slowdown(Script):
     with open(path) as f:
         line = len(f.read().splitlines())
     assert Script(path=path).infer(line=line)
+
+
+def test_time_budget(Script):
+    path = get_example_dir('speed', 'precedence.py')
+    with open(path) as f:
+        line = len(f.read().splitlines())
+    script = Script(path=path)
+    first = time.time()
+    script.infer(line=line, time_budget=0)
+    assert script.timed_out
+    assert time.time() - first < 0.5
+
+    # Incomplete results are not cached.
+    assert script.infer(line=line)
+    assert not script.timed_out
+
+
+def test_time_budget_not_exceeded(Script):
+    script = Script('def foo(): return 1\nfoo()')
+    assert [d.name for d in script.infer(time_budget=10000)] == ['int']
+    assert not script.timed_out
+    assert [c.name for c in script.complete(2, 2, time_budget=10000)][0] == 'foo'
+    assert not script.timed_out
+
+
+def test_batched_subprocess_calls(Script, environment, monkeypatch):
+    from medi.api.environment import InterpreterEnvironment
+    from medi.inference.compiled.subprocess import CompiledSubprocess
+    if isinstance(environment, InterpreterEnvironment):
+        pytest.skip("Only relevant for subprocesses")
+
+    round_trips = []
+    communicate = CompiledSubprocess._communicate
+
+    def counting_communicate(self, calls):
+        round_trips.append(len(calls))
+        return communicate(self, calls)
+
+    monkeypatch.setattr(CompiledSubprocess, '_communicate', counting_communicate)
+    completions = Script('import math\nmath.').complete()
+    del round_trips[:]
+    assert {c.type for c in completions} >= {'function', 'instance'}
+    # Without batching there would be at least one round trip per name.
+    assert len(round_trips) < len(completions) / 4
+
+
+@pytest.mark.parametrize('code', ['"".', 'import collections\ncollections.OrderedDict().'])
+def test_batched_subprocess_calls_of_instances(Script, environment, monkeypatch, code):
+    from medi.api.environment import InterpreterEnvironment
+    from medi.inference.compiled.subprocess import CompiledSubprocess
+    if isinstance(environment, InterpreterEnvironment):
+        pytest.skip("Only relevant for subprocesses")
+
+    round_trips = []
+    communicate = CompiledSubprocess._communicate
+
+    def counting_communicate(self, calls):
+        round_trips.append(len(calls))
+        return communicate(self, calls)
+
+    monkeypatch.setattr(CompiledSubprocess, '_communicate', counting_communicate)
+    completions = Script(code).complete()
+    assert len(completions) > 40
+    assert len(round_trips) < 40
+    del round_trips[:]
+    # The types and docstrings are part of the member table.
+    assert {c.type for c in completions} >= {'function'}
+    [c.docstring(raw=True) for c in completions]
+    assert len(round_trips) < 5
+
+
+def test_member_table(Script, environment, monkeypatch):
+    from medi.api.environment import InterpreterEnvironment
+    from medi.inference.compiled.subprocess import CompiledSubprocess
+    if isinstance(environment, InterpreterEnvironment):
+        pytest.skip("Only relevant for subprocesses")
+
+    calls = []
+    communicate = CompiledSubprocess._communicate
+
+    def recording_communicate(self, c):
+        for inference_state_id, function, args, kwargs in c:
+            # The arguments of get_compiled_method_return are the id of the
+            # access handle and the name of the method.
+            calls.extend(args[1:2])
+        return communicate(self, c)
+
+    monkeypatch.setattr(CompiledSubprocess, '_communicate', recording_communicate)
+    completions = Script('import math\nmath.').complete()
+    del calls[:]
+    names = dict((c.name, c) for c in completions)
+    assert names['sin'].type == 'function'
+    assert names['pi'].type == 'instance'
+    assert names['sin'].name == 'sin'
+    # Everything was part of the member table of the module.
+    for method in ('getattr_paths', 'get_api_type', 'py__name__', 'py__doc__'):
+        assert method not in calls
+
+
+def test_lazy_stub_filters(Script, tmpdir, monkeypatch):
+    from medi.inference.value.module import ModuleValue
+
+    tmpdir.join('star_source.py').write('star_name = 1\n')
+    tmpdir.join('lazy_stub.pyi').write(
+        'from star_source import *\n'
+        'class StubClass: ...\n'
+        'def stub_function() -> StubClass: ...\n'
+    )
+    star_imports = ModuleValue.star_imports
+    followed = []
+
+    def recording_star_imports(self):
+        followed.append(self)
+        return star_imports(self)
+
+    monkeypatch.setattr(ModuleValue, 'star_imports', recording_star_imports)
+    code = 'import lazy_stub\nlazy_stub.stub_function()'
+    project = medi.Project(tmpdir.strpath)
+    defs = Script(code, project=project).infer()
+    assert [d.name for d in defs] == ['StubClass']
+    # The names are defined in the stub, so the star import is not followed.
+    assert not followed
+
+    code = 'import lazy_stub\nlazy_stub.star_name'
+    defs = Script(code, project=project).infer()
+    assert [d.name for d in defs] == ['int']
+    assert followed
+
+
+def test_import_time():
+    """
+    Medi is often imported by short-lived processes (e.g. pre-commit hooks),
+    so importing it should be fast and not load modules that are not needed
+    for most requests.
+    """
+    code = (
+        'import sys, time\n'
+        't = time.time()\n'
+        'import medi\n'
+        'duration = time.time() - t\n'
+        'script = medi.Script("x = 1\\nx")\n'
+        'assert script.infer()\n'
+        'assert script._inference_state._latest_grammar is None\n'
+        'for name in ("pydoc", "colorama", "medi.api.refactoring"):\n'
+        '    assert name not in sys.modules, name\n'
+        'print(duration)\n'
+    )
+    env = dict(os.environ, PYTHONPATH=root_dir)
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    # Usually it takes about 0.1 seconds.
+    assert float(output) < 0.5
+
+
+def test_scope_definition_names(Script, monkeypatch):
+    from medi.inference.filters import ParserTreeFilter
+
+    code = ''.join('def func_%s(a):\n    local_%s = a\n\n' % (i, i) for i in range(100))
+    code += 'def target(x):\n    y = 1\n    \n    return x\n'
+    checked = []
+    is_name_reachable = ParserTreeFilter._is_name_reachable
+
+    def record(self, name):
+        checked.append(name)
+        return is_name_reachable(self, name)
+
+    monkeypatch.setattr(ParserTreeFilter, '_is_name_reachable', record)
+    names = [c.name for c in Script(code).complete(303, 4)]
+    assert 'y' in names and 'func_99' in names and 'local_1' not in names
+    # Only the definitions of the scopes of the position are checked, not
+    # the locals of all the other functions.
+    assert len(checked) < 150
+
+
+def test_self_attribute_definition_names(Script, monkeypatch):
+    from medi.inference.value.instance import SelfAttributeFilter
+
+    code = ''.join(
+        'class C%s:\n    def __init__(self):\n        self.attr_%s = 1\n\n' % (i, i)
+        for i in range(100)
+    )
+    code += 'C5().attr'
+    checked = []
+    filter_self_names = SelfAttributeFilter._filter_self_names
+
+    def record(self, names):
+        checked.extend(names)
+        return filter_self_names(self, names)
+
+    monkeypatch.setattr(SelfAttributeFilter, '_filter_self_names', record)
+    assert [c.name for c in Script(code).complete()] == ['attr_5']
+    # Only the attributes of the class are checked.
+    assert [n.value for n in checked] == ['attr_5']
+
+
+def test_scope_definition_names_changed_code(Script, environment):
+    session = medi.InferenceSession(environment=environment)
+    code = 'def f():\n    a = 1\n    \n    return a\n'
+    names = [c.name for c in Script(code, path='changed.py', session=session).complete(3, 4)]
+    assert 'a' in names and 'b' not in names
+
+    code = 'def f():\n    a = 1\n    b = 2\n    \n    return a\n'
+    names = [c.name for c in Script(code, path='changed.py', session=session).complete(4, 4)]
+    assert 'a' in names and 'b' in names